@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Build:
+    __slots__ = ("builder", "state", "error", "finished_at", "last")
+
+    def __init__(self):
+        self.builder: Any = None
+        self.state = "waiting"
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        # Counters as of the moment the builder was detached
+        self.last: Dict[str, Any] = {}
+
+
+class ProgressTracker:
+    """
+    Live progress of graph builds, keyed by a build ID the caller picks.
+    Handlers register a build, attach the GraphBuilder once it exists and
+    mark it finished; watchers poll the builder's counters. Finished builds
+    are kept for `retention` seconds so a late watcher still sees the end.
+    """
+
+    def __init__(
+        self,
+        retention: float = 60.0,
+        max_builds: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.retention = retention
+        self.max_builds = max_builds
+        self.clock = clock
+        self._builds: Dict[str, _Build] = {}
+
+    def start(self, build_id: str):
+        self._prune()
+        build = self._builds.get(build_id)
+        if build is not None and build.finished_at is None:
+            return
+        if len(self._builds) >= self.max_builds:
+            logger.warning(f"Too many tracked builds; not tracking {build_id}.")
+            return
+        self._builds[build_id] = _Build()
+
+    def attach(self, build_id: str, builder: Any):
+        build = self._builds.get(build_id)
+        # A build shared with another request, or refreshing a stale graph
+        # in the background, may outlive the request that asked for it
+        if build is not None and build.finished_at is None:
+            build.builder = builder
+            build.state = "running"
+
+    def finish(self, build_id: str, error: Optional[str] = None):
+        build = self._builds.get(build_id)
+        if build is None:
+            return
+        if build.builder is not None:
+            build.last = build.builder.progress()
+            build.builder = None
+        build.state = "failed" if error else "done"
+        build.error = error
+        build.finished_at = self.clock()
+
+    def snapshot(self, build_id: str) -> Optional[Dict[str, Any]]:
+        build = self._builds.get(build_id)
+        if build is None:
+            return None
+        counters = build.builder.progress() if build.builder else build.last
+        snapshot = {"build_id": build_id, "state": build.state, **counters}
+        if build.error:
+            snapshot["error"] = build.error
+        return snapshot
+
+    async def watch(
+        self, build_id: str, interval: float = 0.5, wait: float = 10.0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields a snapshot whenever the build's counters change, ending with
+        its final state. Waits up to `wait` seconds for the build to be
+        registered, since the watcher usually connects first.
+        """
+        deadline = self.clock() + wait
+        last = None
+        while True:
+            snapshot = self.snapshot(build_id)
+            if snapshot is None:
+                if self.clock() >= deadline:
+                    yield {"build_id": build_id, "state": "unknown"}
+                    return
+            elif snapshot != last:
+                last = snapshot
+                yield snapshot
+                if snapshot["state"] in ("done", "failed"):
+                    return
+            await asyncio.sleep(interval)
+
+    def _prune(self):
+        cutoff = self.clock() - self.retention
+        expired = [
+            build_id
+            for build_id, build in self._builds.items()
+            if build.finished_at is not None and build.finished_at < cutoff
+        ]
+        for build_id in expired:
+            del self._builds[build_id]
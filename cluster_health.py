@@ -0,0 +1,132 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def cluster_urls(api_url: Optional[str], clusters: Dict[str, List[str]]) -> List[str]:
+    """
+    Returns the failover URLs configured for api_url's host. clusters maps
+    a primary hostname to the URLs of its other nodes.
+    """
+    if not api_url:
+        return []
+    url = api_url.strip()
+    host = (urlparse(url if "://" in url else f"https://{url}").hostname or "").lower()
+    for name, urls in clusters.items():
+        if name.lower() == host:
+            return list(urls)
+    return []
+
+
+class _Circuit:
+    __slots__ = ("state", "failures", "opened_at", "probe_started", "latency")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0  # Consecutive
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.latency: Optional[float] = None  # Moving average, seconds
+
+
+class ClusterHealth:
+    """
+    Circuit breaker and latency tracking per NetSapiens base URL, shared by
+    every NSClient in the process.
+
+    failure_threshold consecutive failures open a URL's circuit and it is
+    skipped. After reset_timeout seconds one request is let through as a
+    probe (half-open): success closes the circuit, failure reopens it.
+    Healthy URLs are ordered by their moving-average latency, fastest first.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        latency_weight: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        # Weight of the newest sample in the latency average
+        self.latency_weight = latency_weight
+        self.clock = clock
+        self._circuits: Dict[str, _Circuit] = {}
+
+    def _circuit(self, url: str) -> _Circuit:
+        circuit = self._circuits.get(url)
+        if circuit is None:
+            circuit = self._circuits[url] = _Circuit()
+        return circuit
+
+    def order(self, urls: List[str]) -> List[str]:
+        """
+        Returns the URLs worth trying, in the order to try them: a due
+        half-open probe first, then closed circuits by latency. URLs
+        without a latency sample yet sort as fastest so they get measured;
+        ties keep the configured order.
+        """
+        now = self.clock()
+        probes = []
+        healthy = []
+        for index, url in enumerate(urls):
+            circuit = self._circuit(url)
+            if circuit.state == CLOSED:
+                healthy.append((circuit.latency or 0.0, index, url))
+            elif now - circuit.opened_at >= self.reset_timeout and (
+                circuit.probe_started is None
+                or now - circuit.probe_started >= self.reset_timeout
+            ):
+                # Let one request through; the rest keep skipping this URL
+                circuit.state = HALF_OPEN
+                circuit.probe_started = now
+                probes.append(url)
+        return probes + [url for _, _, url in sorted(healthy)]
+
+    def record_success(self, url: str, latency: float):
+        circuit = self._circuit(url)
+        if circuit.state != CLOSED:
+            logger.info(f"Circuit for {url} closed after a successful probe.")
+        circuit.state = CLOSED
+        circuit.failures = 0
+        circuit.probe_started = None
+        if circuit.latency is None:
+            circuit.latency = latency
+        else:
+            circuit.latency += self.latency_weight * (latency - circuit.latency)
+
+    def record_failure(self, url: str):
+        circuit = self._circuit(url)
+        circuit.failures += 1
+        if circuit.state == HALF_OPEN or (
+            circuit.state == CLOSED and circuit.failures >= self.failure_threshold
+        ):
+            logger.warning(
+                f"Circuit for {url} opened after {circuit.failures} failures; "
+                f"skipping it for {self.reset_timeout:.0f}s."
+            )
+            circuit.state = OPEN
+            circuit.opened_at = self.clock()
+            circuit.probe_started = None
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            url: {
+                "state": circuit.state,
+                "failures": circuit.failures,
+                "latency_ms": (
+                    round(circuit.latency * 1000, 1)
+                    if circuit.latency is not None
+                    else None
+                ),
+            }
+            for url, circuit in self._circuits.items()
+        }
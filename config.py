@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict  # type: ignore
 
 
@@ -9,6 +11,74 @@ class Settings(BaseSettings):
     # Public URL for the API (used in JS injection)
     PUBLIC_API_URL: str = "http://localhost:8000/graph"
 
+    # Upstream HTTP connection pool (one per NetSapiens host)
+    NS_HTTP_TIMEOUT: float = 10.0
+    NS_HTTP_MAX_CONNECTIONS: int = 100
+    NS_HTTP_MAX_KEEPALIVE: int = 20
+    NS_HTTP_KEEPALIVE_EXPIRY: float = 30.0  # Seconds an idle connection is kept
+    NS_HTTP2: bool = (
+        False  # Multiplex requests over HTTP/2 where the server supports it
+    )
+    NS_PAGE_CONCURRENCY: int = 4  # Pages of users/phone numbers fetched at once
+
+    # Retries of failed NetSapiens API calls (5xx, 429, network errors)
+    NS_RETRIES: int = 2  # Per request; 0 disables
+    NS_RETRY_BACKOFF: float = 0.5  # Seconds, doubled per retry, with full jitter
+    NS_RETRY_MAX_DELAY: float = 10.0  # Longer Retry-After values fail fast
+    NS_RETRY_BUDGET: int = 50  # Retries allowed per graph build
+
+    # Client-side limits per NetSapiens host, shared by all builds. Off by
+    # default; NS_HOST_LIMITS sets them per hostname, e.g.
+    # {"api.example.com": {"rate": 50, "burst": 50, "max_in_flight": 32}}
+    NS_RATE_LIMIT: float = 0.0  # Requests per second; 0 disables
+    NS_RATE_BURST: int = 20
+    NS_MAX_IN_FLIGHT: int = 0  # Concurrent requests; 0 disables
+    NS_HOST_LIMITS: Dict[str, Dict[str, float]] = {}
+
+    # Failover across the nodes of a NetSapiens cluster. NS_CLUSTERS maps a
+    # primary hostname to its other nodes, e.g.
+    # {"api.example.com": ["https://api2.example.com", "https://api3.example.com"]}
+    NS_CLUSTERS: Dict[str, List[str]] = {}
+    NS_CIRCUIT_FAILURES: int = 3  # Consecutive failures before a node is skipped
+    NS_CIRCUIT_RESET: float = 30.0  # Seconds before a skipped node is probed again
+
+    # Cross-request cache of NetSapiens API responses
+    NS_CACHE_ENABLED: bool = True
+    NS_CACHE_TTL: float = 30.0  # Seconds, for endpoints not listed below
+    NS_CACHE_TTLS: Dict[str, float] = {
+        "answerrules": 30.0,
+        "autoattendants": 30.0,
+        "agents": 30.0,
+        "phonenumbers": 60.0,
+        "users": 60.0,
+        "timeframes": 300.0,
+    }
+    NS_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # LRU-evicted beyond this
+
+    # Graph building
+    GRAPH_MAX_CONCURRENCY: int = 8  # DID paths walked in parallel per build
+    GRAPH_PREFETCH_ANSWER_RULES: bool = False  # Load answer rules before walking
+    GRAPH_PREFETCH_MAX_USERS: int = 500  # Above this, prefetch DID-reachable users only
+
+    # Cache of finished graphs (stale-while-revalidate)
+    GRAPH_CACHE_ENABLED: bool = True
+    GRAPH_CACHE_TTL: float = 60.0  # Seconds a graph is served without rebuilding
+    GRAPH_CACHE_STALE_TTL: float = 600.0  # Further seconds served while rebuilding
+    GRAPH_CACHE_MAX_ENTRIES: int = 100
+
+    # Multi-domain builds (/graph/batch)
+    GRAPH_BATCH_MAX_DOMAINS: int = 50  # Domains accepted per request
+    GRAPH_BATCH_MAX_CONCURRENCY: int = 4  # Domains crawled at once per request
+
+    # Background build jobs (/graph/jobs)
+    GRAPH_JOBS_MAX_RUNNING: int = 2  # Crawls run at once per worker process
+    GRAPH_JOBS_MAX_QUEUED: int = 50  # Further submissions get a 503
+    GRAPH_JOBS_RESULT_TTL: float = 300.0  # Seconds finished jobs stay readable
+
+    # Build progress events (/graph/progress/{build_id})
+    GRAPH_PROGRESS_INTERVAL: float = 0.5  # Seconds between progress checks
+    GRAPH_PROGRESS_RETENTION: float = 60.0  # Seconds finished builds stay visible
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
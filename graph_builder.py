@@ -1,12 +1,30 @@
 import asyncio
 import logging
 import re
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+import sys
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from models import (
     CytoscapeElement,
     EdgeData,
     NodeData,
+    NSAnswerRule,
     NSAutoAttendantResponse,
     NSPhoneNumber,
 )
@@ -15,45 +33,600 @@ from utils import format_phone_number, generate_portal_link
 
 logger = logging.getLogger(__name__)
 
+# Destinations that name their type: <phone>_callqueue_<user>,
+# <phone>_attendant_<user> and <phone>_pstn_<phone>
+_COMPOSITE_DEST = re.compile(
+    r"^\d+_(?:callqueue_(?P<queue>\w+)|attendant_(?P<attendant>\w+)|pstn_(?P<pstn>\d+))$"
+)
+_PSTN_NUMBER = re.compile(r"^1?\d{10}$")
+
+
+def _did_digits(number: str) -> str:
+    """A phone number's digits, without the leading 1 of an 11 digit number."""
+    digits = re.sub(r"\D", "", number)
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits
+
+
+# An API resource a node was built from: ("rules", user), ("aa", "owner:prompt")
+# or ("queue", queue). Named after the GraphBuilder caches holding them.
+Resource = Tuple[str, str]
+
+# (child_name, child_type, label, extra_data, should_expand, parent_hint)
+_Child = Tuple[str, str, str, Optional[Dict[str, Any]], bool, Optional[str]]
+
+
+def combine_graphs(graphs: Dict[str, List[CytoscapeElement]]) -> List[CytoscapeElement]:
+    """
+    Merges per-domain graphs into one. Every id (and edge endpoint and
+    parent) is prefixed with its domain, made selector-safe like the ids
+    themselves, so identically named users in different domains stay apart.
+    """
+    combined: List[CytoscapeElement] = []
+    for domain, graph in graphs.items():
+        prefix = re.sub(r"[:@.]", "_", domain) + "__"
+
+        def scoped(value: Optional[str]) -> Optional[str]:
+            return prefix + value if value else value
+
+        for element in graph:
+            data = element.data
+            if isinstance(data, EdgeData):
+                update = {
+                    "id": scoped(data.id),
+                    "source": scoped(data.source),
+                    "target": scoped(data.target),
+                }
+            else:
+                update = {"id": scoped(data.id), "parent": scoped(data.parent)}
+            combined.append(CytoscapeElement(data=data.model_copy(update=update)))
+    return combined
+
+
+class _WorkItem(NamedTuple):
+    """An edge waiting to be walked: source node -> (not yet visited) target."""
+
+    source_id: str
+    target_name: str
+    target_type: str
+    edge_label: str
+    extra_data: Optional[Dict[str, Any]]  # timeframe/priority for answer rules
+    should_expand: bool
+    parent_hint: Optional[str]
+
+
+class _Node:
+    """Node as recorded while crawling; turned into NodeData only on output."""
+
+    __slots__ = ("id", "label", "type", "bg", "link", "parent", "details")
+
+    def __init__(
+        self,
+        id: str,
+        label: str,
+        type: str,
+        bg: Optional[str] = None,
+        link: Optional[str] = None,
+        parent: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+    ):
+        self.id = id
+        self.label = label
+        self.type = type
+        self.bg = bg
+        self.link = link
+        self.parent = parent
+        self.details = details
+
+    def to_element(self, parent: Optional[str] = None) -> CytoscapeElement:
+        """parent applies unless the node has its own, e.g. an intro greeting."""
+        return CytoscapeElement(
+            data=NodeData(
+                id=self.id,
+                label=self.label,
+                type=self.type,
+                bg=self.bg,
+                link=self.link,
+                parent=self.parent or parent,
+                details=self.details,
+            )
+        )
+
+
+class _Edge:
+    """Edge as recorded while crawling; turned into EdgeData only on output."""
+
+    __slots__ = (
+        "id",
+        "source",
+        "target",
+        "label",
+        "timeframe",
+        "priority",
+        "time_range_data",
+        "target_parent",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        source: str,
+        target: str,
+        label: str,
+        timeframe: Optional[str] = None,
+        priority: Optional[int] = None,
+        time_range_data: Optional[List[Dict[str, Any]]] = None,
+        target_parent: Optional[str] = None,
+    ):
+        self.id = id
+        self.source = source
+        self.target = target
+        self.label = label
+        self.timeframe = timeframe
+        self.priority = priority
+        self.time_range_data = time_range_data
+        # Parent the target is drawn in when the graph first reaches it here
+        self.target_parent = target_parent
+
+    def to_element(self) -> CytoscapeElement:
+        return CytoscapeElement(
+            data=EdgeData(
+                id=self.id,
+                source=self.source,
+                target=self.target,
+                label=self.label,
+                timeframe=self.timeframe,
+                priority=self.priority,
+                time_range_data=self.time_range_data,
+            )
+        )
+
+
+_Record = Union[_Node, _Edge]
+
 
 class GraphBuilder:
-    def __init__(self, client: NSClient, domain: str):
+    def __init__(
+        self,
+        client: NSClient,
+        domain: str,
+        max_concurrency: int = 1,
+        prefetch_rules: bool = False,
+        prefetch_max_users: int = 500,
+    ):
         self.client = client
         self.domain = domain
+        # Number of DID paths walked in parallel. 1 keeps the sequential crawl.
+        self.max_concurrency = max(1, max_concurrency)
+        # Load answer rules before walking. Domains with more users than
+        # prefetch_max_users only prefetch users reachable from DIDs.
+        self.prefetch_rules = prefetch_rules
+        self.prefetch_max_users = prefetch_max_users
         self.users_map: Dict[str, Any] = {}
+        # Raw destination -> (type, name, parent), see _get_type_and_name.
+        # Bare names are checked against users_map, so walks classify via
+        # _resolve_target, which waits for the users list when it matters.
+        self._classified: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        # DID node ids in the order elements() lists their call flows
+        self.root_ids: List[str] = []
         self.timeframes_map: Dict[str, Any] = {}
+        # Loads users_map/timeframes_map while DIDs are fetched and walked
+        self._global_data: "Optional[asyncio.Future[None]]" = None
 
         self.rules_cache: Dict[str, List[Any]] = {}
         self.queue_agents_cache: Dict[str, List[Any]] = {}
         self.aa_prompts_cache: Dict[str, Any] = {}
 
+        # In-flight fetches keyed by (cache name, key) so concurrent walks share them
+        self._inflight: Dict[Tuple[str, str], "asyncio.Future[Any]"] = {}
+
+        # Progress counters, see progress()
+        self.dids_total: Optional[int] = None
+        self.dids_done = 0
+        self.depth = 0
+
+        # Subgraph memo shared by every DID walk in a build. Records stay
+        # plain objects until elements()/stream() hand them out. A node's
+        # children are fetched once; each walk then follows them on its own.
+        self._nodes: Dict[str, _Node] = {}
+        self._out_edges: Dict[str, List[_Edge]] = {}
+        self._children: Dict[str, List[_WorkItem]] = {}
+        self._expanding: Dict[str, "asyncio.Future[List[_WorkItem]]"] = {}
+
+        # Dependency index for rebuild(): the nodes built from each API resource
+        self._dependents: Dict[Resource, Set[str]] = {}
+        # Edges whose target is linked but not walked, e.g. queue agents
+        self._terminal_edges: Set[str] = set()
+        self._dids: List[NSPhoneNumber] = []
+        self._update_lock = asyncio.Lock()
+
     async def build(self) -> List[CytoscapeElement]:
-        # 1. Pre-fetch Global Data
+        await self._walk_dids(await self._prepare())
+        return self.elements()
+
+    async def build_did(self, number: str) -> Optional[List[CytoscapeElement]]:
+        """
+        Walks the call flow of one DID only. Returns None if the domain has
+        no such number. Numbers match however they are punctuated.
+        """
+        dids = await self._start()
+        wanted = _did_digits(number)
+        matches = [d for d in dids if _did_digits(d.phonenumber) == wanted]
+        if not matches:
+            if self._global_data is not None:
+                self._global_data.cancel()
+            return None
+        await self._walk_dids(matches[:1])
+        return self.elements()
+
+    async def subgraph(self, number: str) -> Optional[List[CytoscapeElement]]:
+        """
+        One DID's call flow from a finished build, or None if it has none.
+        Shared nodes keep what other DIDs' walks expanded, e.g. a queue
+        agent's own answer rules, just as the DID filter shows them. Waits
+        for a running update(), which changes the memo in place.
+        """
+        async with self._update_lock:
+            wanted = _did_digits(number)
+            for did in self._dids:
+                if _did_digits(did.phonenumber) == wanted:
+                    root_id = self._safe_id(f"did_{did.phonenumber}")
+                    return self._collect(self.root_ids, self._reachable([root_id]))
+            return None
+
+    def progress(self) -> Dict[str, Any]:
+        """Counters for a build in flight. depth is the deepest BFS level reached."""
+        return {
+            "dids_done": self.dids_done,
+            "dids_total": self.dids_total,
+            "depth": self.depth,
+            "api_calls": getattr(self.client, "total_calls", 0),
+            "cache_hits": getattr(self.client, "cache_hits", 0),
+            "retries": getattr(self.client, "retried_calls", 0),
+            "queue_wait": round(getattr(self.client, "queue_wait", 0.0), 3),
+        }
+
+    def elements(self) -> List[CytoscapeElement]:
+        """The graph walked so far, in the order build() returns it."""
+        return self._collect(self.root_ids)
+
+    async def stream(self) -> AsyncIterator[CytoscapeElement]:
+        """
+        Yields elements while the DID walks are still running. Each element
+        is yielded once, and an edge only after the nodes it connects, but
+        the order follows discovery rather than matching build().
+        """
+        batches: "asyncio.Queue[Optional[List[_Record]]]" = asyncio.Queue()
+
+        async def run():
+            try:
+                await self._walk_dids(await self._prepare(), batches.put_nowait)
+            finally:
+                batches.put_nowait(None)
+
+        task = asyncio.ensure_future(run())
+        seen: Set[str] = set()
+        parents: Dict[str, Optional[str]] = {}
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                for record in batch:
+                    if isinstance(record, _Edge):
+                        parents.setdefault(record.target, record.target_parent)
+                # Nodes first, so edges within a batch never dangle
+                batch.sort(key=lambda record: isinstance(record, _Edge))
+                for record in batch:
+                    if record.id not in seen:
+                        seen.add(record.id)
+                        if isinstance(record, _Node):
+                            yield record.to_element(parents.get(record.id))
+                        else:
+                            yield record.to_element()
+            # Re-raise anything the walks failed with
+            await task
+        finally:
+            task.cancel()
+
+    async def _prepare(self) -> List[NSPhoneNumber]:
+        """
+        Starts loading the domain-wide data and returns the DIDs. Walks can
+        begin before users and timeframes arrive; see _wait_for_global_data.
+        """
+        dids = await self._start()
+
+        if self.prefetch_rules:
+            # Sizing the prefetch needs the user count
+            await self._wait_for_global_data()
+            await self._prefetch_answer_rules(dids)
+
+        return dids
+
+    async def _start(self) -> List[NSPhoneNumber]:
+        # 1. Pre-fetch Global Data, alongside the DIDs
         logger.info(f"Fetching global data for domain {self.domain}...")
-        await self._fetch_global_data()
+        self._global_data = asyncio.ensure_future(self._fetch_global_data())
 
         # 2. Identify Roots (DIDs)
         logger.info(f"Fetching DIDs for domain {self.domain}...")
-        dids = await self.client.get_dids(self.domain)
-        logger.info(f"Found {len(dids) if dids else 0} DIDs.")
-
-        # We use a dict to deduplicate elements by ID
-        elements_map: Dict[str, CytoscapeElement] = {}
-
-        for did_obj in dids:
-            logger.debug(f"Processing call flow for DID: {did_obj.phonenumber}")
-            path_elements = await self._process_did_path(did_obj)
+        try:
+            dids = await self.client.get_dids(self.domain) or []
+        except BaseException:
+            self._global_data.cancel()
+            raise
+        logger.info(f"Found {len(dids)} DIDs.")
+        return dids
+
+    async def update(
+        self,
+        changed: Optional[Iterable[Resource]] = None,
+        client: Optional[NSClient] = None,
+    ) -> Optional[List[CytoscapeElement]]:
+        """
+        Brings a finished build up to date through client (by default the
+        one it was built with). changed names the resources known to have
+        changed; without it they are found by re-fetching everything the
+        build read, see changed_resources(). Returns the new graph, or None
+        when domain-wide data changed and only a full build() will do.
+        """
+        async with self._update_lock:
+            if client is not None:
+                self.client = client
+            refetched = None
+            if changed is None:
+                refetched = await self.changed_resources()
+                if refetched is None:
+                    return None
+                changed = refetched
+            return await self.rebuild(changed, refetched)
+
+    async def changed_resources(self) -> Optional[Dict[Resource, Any]]:
+        """
+        Re-fetches the DIDs, users, timeframes and every resource the build
+        read, and returns the resources that differ with their new values.
+        None means the DIDs, users or timeframes changed. Cheap when the
+        client revalidates its cached responses: unchanged ones come back
+        as 304s.
+        """
+        dids, users, timeframes = await asyncio.gather(
+            self.client.get_dids(self.domain),
+            self.client.get_users(self.domain),
+            self.client.get_domain_timeframes(self.domain),
+        )
+        if (
+            list(dids or []) != self._dids
+            or {u.user: u for u in users or []} != self.users_map
+            or {t.frame: t for t in timeframes or []} != self.timeframes_map
+        ):
+            logger.info(f"Domain data changed for {self.domain}; rebuilding fully.")
+            return None
+
+        caches = self._resource_caches()
+        fetched = [
+            resource
+            for resource in self._dependents
+            if resource[1] in caches[resource[0]]
+        ]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def refetch(resource: Resource) -> Any:
+            async with semaphore:
+                return await self._resource_fetch(resource)()
+
+        results = await asyncio.gather(*(refetch(r) for r in fetched))
+        changed = {
+            resource: value
+            for resource, value in zip(fetched, results)
+            if value != caches[resource[0]][resource[1]]
+        }
+        logger.info(
+            f"{len(changed)} of {len(fetched)} resources changed for {self.domain}."
+        )
+        return changed
+
+    async def rebuild(
+        self,
+        changed: Iterable[Resource],
+        refetched: Optional[Dict[Resource, Any]] = None,
+    ) -> List[CytoscapeElement]:
+        """
+        Re-fetches only the nodes built from the changed resources and
+        returns the updated graph. Every DID is walked again over the memo,
+        so nodes their new children lead to are walked exactly as a full
+        build would, while unchanged nodes cost no API calls. refetched
+        holds new values already fetched for some of the changed resources,
+        which are used rather than fetched again.
+        """
+        changed = set(changed)
+        caches = self._resource_caches()
+        for kind, key in changed:
+            caches[kind].pop(key, None)
+            if kind == "aa":
+                # Nested menus are cached under their parent's key
+                for nested in [k for k in caches["aa"] if k.startswith(f"{key}:")]:
+                    del caches["aa"][nested]
+            if refetched is not None and (kind, key) in refetched:
+                caches[kind][key] = refetched[(kind, key)]
+
+        affected = set().union(*(self._dependents.get(r, set()) for r in changed))
+        affected &= self._reachable(self.root_ids)
+        logger.info(
+            f"Rebuilding {len(affected)} nodes for {len(changed)} changed resources "
+            f"in {self.domain}."
+        )
+        for node_id in affected:
+            # Re-materialized and re-expanded by the walks below
+            self._nodes.pop(node_id, None)
+            self._children.pop(node_id, None)
+            self._out_edges.pop(node_id, None)
+
+        await self._walk_dids(self._dids)
+        self._prune_expansions()
+        return self.elements()
+
+    def dependent_dids(self, changed: Iterable[Resource]) -> List[str]:
+        """DID node ids whose call flows use any of the changed resources."""
+        nodes = set().union(*(self._dependents.get(r, set()) for r in changed))
+        return [
+            root_id for root_id in self.root_ids if self._reachable([root_id]) & nodes
+        ]
+
+    def _prune_expansions(self):
+        """
+        Forgets the expansions of nodes no DID's walk follows any more, e.g.
+        a user now only listed as a queue agent, as a full build would not
+        have walked them.
+        """
+        walked = set(self.root_ids)
+        for root_id in self.root_ids:
+            for edge, first in self._replay(root_id):
+                if first and edge.id not in self._terminal_edges:
+                    walked.add(edge.target)
+        for node_id in set(self._children) - walked:
+            del self._children[node_id]
+            self._out_edges.pop(node_id, None)
+
+    def _replay(self, root_id: str) -> Iterator[Tuple[_Edge, bool]]:
+        """
+        Replays one DID's walk over the memo, yielding each edge it follows
+        and whether that edge is the first to reach its target in the walk.
+        """
+        visited = {root_id}
+        queue = deque(self._out_edges.get(root_id, []))
+        while queue:
+            edge = queue.popleft()
+            first = edge.target not in visited
+            yield edge, first
+            if first:
+                visited.add(edge.target)
+                if edge.id not in self._terminal_edges:
+                    queue.extend(self._out_edges.get(edge.target, []))
+
+    def _reachable(self, root_ids: List[str]) -> Set[str]:
+        seen = set(root_ids)
+        queue = deque(root_ids)
+        while queue:
+            for edge in self._out_edges.get(queue.popleft(), []):
+                if edge.target not in seen:
+                    seen.add(edge.target)
+                    queue.append(edge.target)
+        return seen
+
+    def _resource(self, node_type: str, node_name: str) -> Optional[Resource]:
+        """The API resource a node of this type and name is built from."""
+        if node_type == "user":
+            return ("rules", node_name)
+        if node_type == "call_queue":
+            return ("queue", node_name)
+        if node_type == "auto_attendant":
+            owner, _, prompt = node_name.partition(":")
+            # Unscoped names use the name as owner and prompt, nested menus
+            # ("owner:prompt:nested_...") come from their parent's prompt
+            prompt = prompt.split(":", 1)[0] if prompt else owner
+            return ("aa", f"{owner}:{prompt}")
+        return None
+
+    def _resource_caches(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "rules": self.rules_cache,
+            "aa": self.aa_prompts_cache,
+            "queue": self.queue_agents_cache,
+        }
+
+    def _resource_fetch(self, resource: Resource) -> Callable[[], Awaitable[Any]]:
+        kind, key = resource
+        if kind == "rules":
+            return lambda: self.client.get_answer_rules(self.domain, key)
+        if kind == "queue":
+            return lambda: self.client.get_call_queue_agents(self.domain, key)
+        owner, prompt = key.split(":", 1)
+        return lambda: self.client.get_auto_attendant_prompts(
+            self.domain, owner, prompt
+        )
 
-            for el in path_elements:
-                if isinstance(el.data, NodeData):
-                    el_id = el.data.id
-                elif isinstance(el.data, EdgeData):
-                    el_id = el.data.id or f"{el.data.source}_{el.data.target}"
+    async def _wait_for_global_data(self):
+        if self._global_data is not None:
+            # Shielded: one cancelled walk mustn't cancel the shared fetch
+            await asyncio.shield(self._global_data)
+
+    async def _walk_dids(
+        self,
+        dids: List[NSPhoneNumber],
+        on_elements: Optional[Callable[[List[_Record]], None]] = None,
+    ):
+        self._dids = list(dids)
+        self.root_ids = [self._safe_id(f"did_{d.phonenumber}") for d in dids]
+        self.dids_total = len(dids)
+        self.dids_done = 0
+
+        # 3. Walk DID paths, up to max_concurrency at a time
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def walk(did_obj: NSPhoneNumber) -> List[_Record]:
+            async with semaphore:
+                logger.debug(f"Processing call flow for DID: {did_obj.phonenumber}")
+                try:
+                    return await self._process_did_path(did_obj, on_elements)
+                finally:
+                    self.dids_done += 1
+
+        walks = [asyncio.ensure_future(walk(did_obj)) for did_obj in dids]
+        try:
+            await asyncio.gather(*walks)
+        except BaseException:
+            # gather leaves the other walks running; stop them and whatever
+            # they were fetching rather than crawl on for a failed build
+            pending: List["asyncio.Future[Any]"] = [
+                *walks,
+                *self._expanding.values(),
+                *self._inflight.values(),
+            ]
+            if self._global_data is not None:
+                pending.append(self._global_data)
+            for task in pending:
+                task.cancel()
+            raise
+        # Nothing may have needed the users list; don't leave it running
+        await self._wait_for_global_data()
+
+    def _collect(
+        self, root_ids: List[str], within: Optional[Set[str]] = None
+    ) -> List[CytoscapeElement]:
+        """
+        Flattens the memo into a deduplicated element list in the order the
+        sequential crawl gave: each root's walk in turn, each element first
+        listed by the walk that first reached it, and a node drawn in the
+        parent that walk's edge gives it. Reading the memo rather than
+        per-walk output keeps that independent of concurrent walk timing.
+        within limits the output to those nodes and the edges leaving them.
+        """
+        # We use a dict to deduplicate records by ID, with each node's parent
+        records: Dict[str, Tuple[_Record, Optional[str]]] = {}
+
+        for root_id in root_ids:
+            root = self._nodes.get(root_id)
+            if root is None:
+                continue
+            records.setdefault(root_id, (root, None))
 
-                if el_id not in elements_map:
-                    elements_map[el_id] = el
+            for edge, first in self._replay(root_id):
+                records.setdefault(edge.id, (edge, None))
+                node = self._nodes.get(edge.target)
+                if first and node:
+                    records.setdefault(edge.target, (node, edge.target_parent))
 
-        return list(elements_map.values())
+        return [
+            (
+                record.to_element(parent)
+                if isinstance(record, _Node)
+                else record.to_element()
+            )
+            for record, parent in records.values()
+            if within is None
+            or (record.id if isinstance(record, _Node) else record.source) in within
+        ]
 
     async def _fetch_global_data(self):
         results = await asyncio.gather(
@@ -74,28 +647,146 @@ class GraphBuilder:
             self.timeframes_map = {t.frame: t for t in timeframes}
             logger.debug(f"Cached {len(self.timeframes_map)} timeframes.")
 
+    async def _prefetch_answer_rules(self, dids: List[NSPhoneNumber]):
+        """
+        Loads answer rules into rules_cache ahead of the walk, at most
+        max_concurrency requests at a time. Small domains load every user.
+        Larger ones start from users the DIDs point at and follow
+        user-to-user forwards, leaving everything else to the lazy walk.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(user: str) -> List[NSAnswerRule]:
+            async with semaphore:
+                return await self._fetch_once(
+                    self.rules_cache,
+                    "rules",
+                    user,
+                    lambda: self.client.get_answer_rules(self.domain, user),
+                )
+
+        follow_forwards = len(self.users_map) > self.prefetch_max_users
+        if follow_forwards:
+            wave = []
+            for did_obj in dids:
+                if did_obj.dest:
+                    dest_type, dest_name, _ = self._get_type_and_name(did_obj.dest)
+                    if dest_type == "user":
+                        wave.append(dest_name)
+        else:
+            wave = list(self.users_map)
+
+        wave = list(dict.fromkeys(wave))
+        seen = set(wave)
+        logger.info(
+            f"Prefetching answer rules for {len(wave)} users "
+            f"({'reachable from DIDs' if follow_forwards else 'all users'})."
+        )
+
+        while wave:
+            results = await asyncio.gather(
+                *(fetch(user) for user in wave), return_exceptions=True
+            )
+
+            next_wave = []
+            for user, rules in zip(wave, results):
+                if isinstance(rules, BaseException):
+                    # The walk retries (and surfaces the error) if it needs them
+                    logger.warning(
+                        f"Failed to prefetch answer rules for {user}: {rules}"
+                    )
+                    continue
+                if not follow_forwards:
+                    continue
+                for rule in rules or []:
+                    for _, target in self._rule_targets(rule):
+                        target_type, target_name, _ = self._get_type_and_name(target)
+                        if target_type == "user" and target_name not in seen:
+                            seen.add(target_name)
+                            next_wave.append(target_name)
+            wave = next_wave
+
+    async def _fetch_once(
+        self,
+        cache: Dict[str, Any],
+        cache_name: str,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Returns cache[key], calling fetch() to populate it on a miss.
+        Concurrent callers asking for the same key await a single fetch.
+        """
+        if key in cache:
+            return cache[key]
+
+        inflight_key = (cache_name, key)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[inflight_key] = task
+            try:
+                cache[key] = await asyncio.shield(task)
+            finally:
+                self._inflight.pop(inflight_key, None)
+            return cache[key]
+
+        return await asyncio.shield(task)
+
     def _safe_id(self, val: str) -> str:
-        return val.replace(":", "_").replace("@", "_").replace(".", "_")
+        # Interned: every edge repeats the ids of the nodes it connects
+        return sys.intern(val.replace(":", "_").replace("@", "_").replace(".", "_"))
+
+    async def _resolve_target(
+        self, target: Union[str, int]
+    ) -> Tuple[str, str, Optional[str]]:
+        """
+        _get_type_and_name for use during a walk. Only targets that no
+        pattern identifies need users_map, so only those wait for it.
+        """
+        target = str(target)
+        if target not in self._classified and self._classify_pattern(target) is None:
+            await self._wait_for_global_data()
+        return self._get_type_and_name(target)
 
     def _get_type_and_name(
         self, target: Union[str, int]
     ) -> Tuple[str, str, Optional[str]]:
         target = str(target)
+        # The same destinations recur across rules, AA options and DIDs
+        classified = self._classified.get(target)
+        if classified is None:
+            classified = self._classify(target)
+            self._classified[target] = classified
+        return classified
+
+    def _classify(self, target: str) -> Tuple[str, str, Optional[str]]:
+        classified = self._classify_pattern(target)
+        if classified is not None:
+            return classified
+
+        if target in self.users_map:
+            return "user", target, None
+        if _PSTN_NUMBER.match(target):
+            return "offnet", target, None
 
-        # New pattern: <phone>_callqueue_<user>
-        m_queue = re.match(r"^\d+_callqueue_(\w+)$", target)
-        if m_queue:
-            return "call_queue", m_queue.group(1), f"user_{m_queue.group(1)}"
+        if target.lower() == "hangup":
+            return "hangup", "Hangup", None
 
-        # New pattern: <phone>_attendant_<user>
-        m_att = re.match(r"^\d+_attendant_(\w+)$", target)
-        if m_att:
-            return "user", m_att.group(1), None
+        return "other", target, None
 
-        # New pattern: <phone>_pstn_<phone>
-        m_pstn = re.match(r"^\d+_pstn_(\d+)$", target)
-        if m_pstn:
-            return "offnet", m_pstn.group(1), None
+    def _classify_pattern(
+        self, target: str
+    ) -> Optional[Tuple[str, str, Optional[str]]]:
+        """Classifies targets whose form gives their type away, else None."""
+        m_composite = _COMPOSITE_DEST.match(target)
+        if m_composite:
+            if m_composite.group("queue"):
+                queue = m_composite.group("queue")
+                return "call_queue", queue, f"user_{queue}"
+            if m_composite.group("attendant"):
+                return "user", m_composite.group("attendant"), None
+            return "offnet", m_composite.group("pstn"), None
 
         if "Prompt" in target or "Announce" in target:
             return "auto_attendant", target, None
@@ -110,24 +801,21 @@ class GraphBuilder:
             return "user", u_name, None
         if "phone_" in target:
             return "device", target.replace("phone_", ""), None
-        if target in self.users_map:
-            return "user", target, None
-        if re.match(r"^1?\d{10}$", target):
-            return "offnet", target, None
-
-        
-
-        if target.lower() == "hangup":
-            return "hangup", "Hangup", None
-
-        return "other", target, None
-
-    async def _process_did_path(self, did_obj: NSPhoneNumber) -> List[CytoscapeElement]:
-        elements: List[CytoscapeElement] = []
-        visited: Set[str] = set()
-
-        # Queue item: (source_id, target_name, target_type, edge_label, extra_edge_data, should_expand, parent_hint)
-        queue: List[Tuple[str, str, str, str, Dict[str, Any], bool, Optional[str]]] = []
+        return None
+
+    async def _process_did_path(
+        self,
+        did_obj: NSPhoneNumber,
+        on_elements: Optional[Callable[[List[_Record]], None]] = None,
+    ) -> List[_Record]:
+        """
+        Walks the call flow of one DID, recording nodes and edges in the
+        build's subgraph memo, and returns the records this walk created.
+        Children another walk already fetched are followed from the memo
+        rather than fetched again. on_elements, if given, receives each BFS
+        level's new records as soon as the level is done.
+        """
+        elements: List[_Record] = []
 
         did = did_obj.phonenumber
         dest = did_obj.dest
@@ -136,275 +824,395 @@ class GraphBuilder:
             logger.warning(f"DID {did} has no destination.")
             return []
 
-        # 1. Create Ingress Node
+        # 1. Create Ingress Node, unless an earlier walk of this DID did
         root_id = self._safe_id(f"did_{did}")
-        formatted_did = format_phone_number(did)
-
-        elements.append(
-            CytoscapeElement(
-                data=NodeData(
-                    id=root_id,
-                    label=f"Phone Number: {formatted_did}",
-                    type="ingress",
-                    bg="#E0E0E0",
-                    link=generate_portal_link(self.domain, "ingress", did),
-                    details={"Destination": dest, "Application": did_obj.application},
-                )
+        children = self._children.get(root_id)
+        own = children is None
+        if children is None:
+            formatted_did = format_phone_number(did)
+
+            root = _Node(
+                id=root_id,
+                label=f"Phone Number: {formatted_did}",
+                type="ingress",
+                bg="#E0E0E0",
+                link=generate_portal_link(self.domain, "ingress", did),
+                details={"Destination": dest, "Application": did_obj.application},
             )
-        )
-
-        visited.add(root_id)
+            self._nodes[root_id] = root
+            elements.append(root)
 
-        initial_type, initial_name, initial_parent = self._get_type_and_name(dest)
-        queue.append(
-            (
-                root_id,
-                initial_name,
-                initial_type,
-                "Destination",
-                {},
-                True,
-                initial_parent,
+            initial_type, initial_name, initial_parent = await self._resolve_target(
+                dest
             )
-        )
+            children = [
+                _WorkItem(
+                    root_id,
+                    initial_name,
+                    initial_type,
+                    "Destination",
+                    None,
+                    True,
+                    initial_parent,
+                )
+            ]
+            self._children[root_id] = children
 
-        while queue:
-            (
-                source_id,
-                target_name,
-                target_type_hint,
-                edge_label,
-                extra_data,
-                should_expand,
-                parent_hint,
-            ) = queue.pop(0)
-
-            raw_node_id = f"{target_type_hint}_{target_name}"
-            node_id = self._safe_id(raw_node_id)
-
-            edge_id = self._safe_id(f"edge_{source_id}_{node_id}")
-
-            edge_data_args = {
-                "id": edge_id,
-                "source": self._safe_id(source_id),
-                "target": node_id,
-                "label": edge_label,
-                **extra_data,
-            }
-
-            elements.append(CytoscapeElement(data=EdgeData(**edge_data_args)))
-
-            if node_id in visited:
-                continue
-            visited.add(node_id)
+        queue: Deque[Tuple[_WorkItem, bool]] = deque((item, own) for item in children)
+        await self._walk(queue, {root_id}, elements, on_elements)
+        return elements
 
-            node_label = target_name
-            bg_color = "#ADD8E6"  # Default User Blue
-            node_link: Optional[str] = generate_portal_link(
-                self.domain, target_type_hint, target_name
-            )
-            node_parent = None
-            if parent_hint:
-                node_parent = self._safe_id(parent_hint)
-
-            async def get_aa_response(owner, prompt):
-                cache_key = f"{owner}:{prompt}"
-                if cache_key in self.aa_prompts_cache:
-                    return self.aa_prompts_cache[cache_key]
-                resp = await self.client.get_auto_attendant_prompts(
-                    self.domain, owner, prompt
-                )
-                self.aa_prompts_cache[cache_key] = resp
-                return resp
-
-            node_details = {}
-
-            if target_type_hint == "user":
-                user_details = self.users_map.get(target_name)
-                if user_details:
-                    fname = user_details.name_first_name or ""
-                    lname = user_details.name_last_name or ""
-                    full_name = f"{fname} {lname}".strip()
-                    if full_name:
-                        node_label = f"{full_name} ({target_name})"
-
-                    node_details = {
-                        "Email": user_details.email,
-                        "Department": user_details.department,
-                        "Site": user_details.site,
-                        "Status": user_details.status_message,
-                    }
-                    node_details = {k: v for k, v in node_details.items() if v}
-            elif target_type_hint == "auto_attendant":
-                bg_color = "#FFD700"  # Gold for AA
-                owner = None
-                prompt = None
-
-                if ":" in target_name:
-                    owner, prompt = target_name.split(":", 1)
-
-                if owner and prompt:
-                    try:
-                        aa_resp = await get_aa_response(owner, prompt)
-                        if aa_resp:
-                            name = aa_resp.attendant_name or "Auto Attendant"
-                            start = aa_resp.starting_prompt or prompt
-
-                            node_details = {
-                                "Attendant Name": name,
-                                "Starting Prompt": start,
-                                "Owner": owner,
-                            }
-
-                            # Intro Greeting Detection
-                            is_intro = False
-                            if "Announce" in prompt:
-                                found_script = None
-                                found_timeframe = None
-                                found_ordinal = None
-
-                                digits = re.findall(r"\d+", prompt)
-                                if digits and aa_resp.intro_greetings:
-                                    target_id = int(digits[-1])
-                                    for greeting in aa_resp.intro_greetings:
-                                        if isinstance(greeting, dict):
-                                            audio = greeting.get("audio", {})
-                                            if audio.get("ordinal-order") == target_id:
-                                                found_script = audio.get(
-                                                    "file-script-text"
-                                                )
-                                                found_timeframe = greeting.get(
-                                                    "time-frame"
-                                                )
-                                                found_ordinal = target_id
-                                                break
-                                if found_script:
-                                    node_details["Intro Script"] = found_script
-
-                                if found_timeframe and found_ordinal:
-                                    node_label = f"Intro Greeting: {found_timeframe} ({found_ordinal})"
-                                    is_intro = True
-                                    # Set Parent to Main AA
-                                    # Construct Main AA ID. Assuming Main AA ID format matches standard AA.
-                                    # If Main AA is 'owner:start', then ID is auto_attendant_owner_start
-                                    main_aa_id_raw = f"auto_attendant_{owner}_{start}"
-                                    node_parent = self._safe_id(main_aa_id_raw)
-
-                            if not is_intro:
-                                node_label = f"{name} ({start})"
-                        else:
-                            node_label = f"Auto Attendant: {prompt}"
-                    except Exception as e:
-                        logger.warning(f"Error fetching AA details: {e}")
-                        node_label = f"Auto Attendant: {prompt}"
-                else:
-                    node_label = f"Auto Attendant: {target_name}"
-
-                # If not intro greeting, check for user grouping
-                if not node_parent and source_id.startswith("user_"):
-                    node_parent = self._safe_id(source_id)
-
-                # If nested AA, make it a child of the source AA
-                if (
-                    not node_parent
-                    and source_id.startswith("auto_attendant_")
-                    and "nested_" in target_name
-                ):
-                    node_parent = self._safe_id(source_id)
-
-            elif target_type_hint == "call_queue":
-                bg_color = "#FFA500"  # Orange for Queue
-                node_label = f"Queue: {target_name}"
-                potential_parent = self._safe_id(f"user_{target_name}")
-                if source_id == potential_parent:
-                    node_parent = potential_parent
-
-            elif target_type_hint == "voicemail":
-                bg_color = "#A9A9A9"  # Dark Grey for Voicemail
-                if "vmail_" in target_name:
-                    node_label = f"Voicemail ({target_name.replace('vmail_', '')})"
-
-            elif target_type_hint == "offnet":
-                bg_color = "#90EE90"  # Light Green for External
-                node_label = f"External: {format_phone_number(target_name)}"
-                node_link = None
-
-            elif target_type_hint == "hangup":
-                bg_color = "#FF6347"  # Tomato for Hangup
-                node_label = "Hangup"
-                node_link = None
-
-            elif target_type_hint == "other":
-                bg_color = "#D3D3D3"  # Light Grey
-                node_label = f"Other: {target_name}"
-                node_link = None
-
-            elif target_type_hint == "directory":
-                bg_color = "#DA70D6"  # Orchid for Directory
-                node_label = "Directory"
-                node_link = None
-
-            elif target_type_hint == "conference":
-                bg_color = "#EE82EE"  # Violet for Conference
-                node_label = f"Conference Bridge: {target_name}"
-                # Link is handled by generate_portal_link ("conference")
-
-            elif target_type_hint == "device":
-                bg_color = "#D8BFD8"  # Thistle
-                node_label = f"Device: {target_name}"
-                node_link = None
-
-            elements.append(
-                CytoscapeElement(
-                    data=NodeData(
-                        id=node_id,
-                        label=node_label,
-                        type=target_type_hint,
-                        bg=bg_color,
-                        link=node_link,
-                        parent=node_parent,
-                        details=node_details,
+    async def _walk(
+        self,
+        queue: Deque[Tuple[_WorkItem, bool]],
+        visited: Set[str],
+        elements: List[_Record],
+        on_elements: Optional[Callable[[List[_Record]], None]] = None,
+    ):
+        """
+        Walks the queued edges breadth first as one DID's walk, like the
+        sequential crawl did: a node is walked from the first edge reaching
+        it in this walk, and only if that edge expands. Each queued item
+        says whether this walk fetched its source's children, and so
+        records its edge. The records created are appended to elements;
+        on_elements receives those not yet reported after each level.
+        """
+        emitted = 0
+        depth = 0
+        while queue:
+            depth += 1
+            self.depth = max(self.depth, depth)
+
+            # Everything queued is one BFS level. Record its edges and claim its
+            # new nodes first, then fetch what they need concurrently, so
+            # latency grows with call-flow depth rather than node count.
+            level: List[_Edge] = []
+            to_materialize: Dict[str, _WorkItem] = {}
+            to_walk: Dict[str, _WorkItem] = {}
+
+            for _ in range(len(queue)):
+                item, own = queue.popleft()
+
+                node_id = self._safe_id(f"{item.target_type}_{item.target_name}")
+
+                if own:
+                    source_id = self._safe_id(item.source_id)
+                    edge = _Edge(
+                        self._safe_id(f"edge_{item.source_id}_{node_id}"),
+                        source_id,
+                        node_id,
+                        item.edge_label,
+                        **(item.extra_data or {}),
+                        target_parent=self._target_parent(item),
                     )
-                )
+                    self._out_edges.setdefault(source_id, []).append(edge)
+                    level.append(edge)
+                    if not item.should_expand:
+                        self._terminal_edges.add(edge.id)
+
+                if node_id in visited:
+                    continue
+                visited.add(node_id)
+
+                if node_id not in self._nodes:
+                    to_materialize[node_id] = item
+                    resource = self._resource(item.target_type, item.target_name)
+                    if resource is not None:
+                        self._dependents.setdefault(resource, set()).add(node_id)
+
+                if item.should_expand:
+                    to_walk[node_id] = item
+
+            materialized, expansions = await asyncio.gather(
+                asyncio.gather(
+                    *(
+                        self._materialize_node(
+                            node_id, item.target_name, item.target_type
+                        )
+                        for node_id, item in to_materialize.items()
+                    )
+                ),
+                asyncio.gather(
+                    *(
+                        self._walk_children(node_id, item)
+                        for node_id, item in to_walk.items()
+                    )
+                ),
             )
 
-            # Expand Children
-            if should_expand:
-                children = await self._expand_node(target_name, target_type_hint)
-                for (
-                    child_name,
-                    child_type,
-                    child_label,
-                    child_extra,
-                    child_should_expand,
-                    child_parent,
-                ) in children:
-                    queue.append(
-                        (
-                            node_id,
-                            child_name,
-                            child_type,
-                            child_label,
-                            child_extra,
-                            child_should_expand,
-                            child_parent,
-                        )
+            new_nodes: Dict[str, _Node] = {}
+            for node_id, node in zip(to_materialize, materialized):
+                # Another walk may have materialized it while we were awaiting
+                if node_id not in self._nodes:
+                    self._nodes[node_id] = node
+                    new_nodes[node_id] = node
+
+            for edge in level:
+                elements.append(edge)
+                if edge.target in new_nodes:
+                    elements.append(new_nodes.pop(edge.target))
+            # Reached through edges another walk records
+            elements.extend(new_nodes.values())
+
+            # Reported before the next await, so any node another walk finds
+            # in the memo has already been handed to on_elements
+            if on_elements is not None:
+                on_elements(elements[emitted:])
+                emitted = len(elements)
+
+            for children, own in expansions:
+                queue.extend((child, own) for child in children)
+
+    async def _walk_children(
+        self, node_id: str, item: _WorkItem
+    ) -> Tuple[List[_WorkItem], bool]:
+        """
+        Returns the work items node_id expands to, and whether this call
+        fetched them. Concurrent walks reaching the node share one fetch.
+        """
+        children = self._children.get(node_id)
+        if children is not None:
+            return children, False
+        pending = self._expanding.get(node_id)
+        if pending is not None:
+            return await asyncio.shield(pending), False
+
+        async def expand() -> List[_WorkItem]:
+            try:
+                children = [
+                    _WorkItem(node_id, *child)
+                    for child in await self._expand_node(
+                        item.target_name, item.target_type
                     )
+                ]
+                self._children[node_id] = children
+                return children
+            finally:
+                self._expanding.pop(node_id, None)
+
+        task = asyncio.ensure_future(expand())
+        self._expanding[node_id] = task
+        return await asyncio.shield(task), True
+
+    def _target_parent(self, item: _WorkItem) -> Optional[str]:
+        """
+        Returns the parent item's target is drawn in when reached through
+        item. Kept on the edge rather than the node, as a node shared by
+        several sources must not depend on which walk materialized it.
+        """
+        source_id = item.source_id
+        node_parent = self._safe_id(item.parent_hint) if item.parent_hint else None
+
+        if item.target_type == "auto_attendant" and not node_parent:
+            # Group a menu under the user that owns it
+            if source_id.startswith("user_"):
+                node_parent = self._safe_id(source_id)
+            # If nested AA, make it a child of the source AA
+            elif (
+                source_id.startswith("auto_attendant_")
+                and "nested_" in item.target_name
+            ):
+                node_parent = self._safe_id(source_id)
+
+        elif item.target_type == "call_queue":
+            potential_parent = self._safe_id(f"user_{item.target_name}")
+            if source_id == potential_parent:
+                node_parent = potential_parent
+
+        return node_parent
+
+    async def _materialize_node(
+        self,
+        node_id: str,
+        target_name: str,
+        target_type_hint: str,
+    ) -> _Node:
+        """
+        Builds the node for a target. Only an intro greeting gets its parent
+        here; parents that depend on the source come from _target_parent.
+        """
+        node_label = target_name
+        bg_color = "#ADD8E6"  # Default User Blue
+        node_link: Optional[str] = generate_portal_link(
+            self.domain, target_type_hint, target_name
+        )
+        node_parent = None
+
+        async def get_aa_response(owner, prompt):
+            return await self._fetch_once(
+                self.aa_prompts_cache,
+                "aa",
+                f"{owner}:{prompt}",
+                lambda: self.client.get_auto_attendant_prompts(
+                    self.domain, owner, prompt
+                ),
+            )
 
-        return elements
+        node_details = {}
+
+        if target_type_hint == "user":
+            await self._wait_for_global_data()
+            user_details = self.users_map.get(target_name)
+            if user_details:
+                fname = user_details.name_first_name or ""
+                lname = user_details.name_last_name or ""
+                full_name = f"{fname} {lname}".strip()
+                if full_name:
+                    node_label = f"{full_name} ({target_name})"
+
+                node_details = {
+                    "Email": user_details.email,
+                    "Department": user_details.department,
+                    "Site": user_details.site,
+                    "Status": user_details.status_message,
+                }
+                node_details = {k: v for k, v in node_details.items() if v}
+        elif target_type_hint == "auto_attendant":
+            bg_color = "#FFD700"  # Gold for AA
+            owner = None
+            prompt = None
+
+            if ":" in target_name:
+                owner, prompt = target_name.split(":", 1)
+
+            if owner and prompt:
+                try:
+                    aa_resp = await get_aa_response(owner, prompt)
+                    if aa_resp:
+                        name = aa_resp.attendant_name or "Auto Attendant"
+                        start = aa_resp.starting_prompt or prompt
+
+                        node_details = {
+                            "Attendant Name": name,
+                            "Starting Prompt": start,
+                            "Owner": owner,
+                        }
+
+                        # Intro Greeting Detection
+                        is_intro = False
+                        if "Announce" in prompt:
+                            found_script = None
+                            found_timeframe = None
+                            found_ordinal = None
+
+                            digits = re.findall(r"\d+", prompt)
+                            if digits and aa_resp.intro_greetings:
+                                target_id = int(digits[-1])
+                                for greeting in aa_resp.intro_greetings:
+                                    if isinstance(greeting, dict):
+                                        audio = greeting.get("audio", {})
+                                        if audio.get("ordinal-order") == target_id:
+                                            found_script = audio.get("file-script-text")
+                                            found_timeframe = greeting.get("time-frame")
+                                            found_ordinal = target_id
+                                            break
+                            if found_script:
+                                node_details["Intro Script"] = found_script
+
+                            if found_timeframe and found_ordinal:
+                                node_label = f"Intro Greeting: {found_timeframe} ({found_ordinal})"
+                                is_intro = True
+                                # Set Parent to Main AA
+                                # Construct Main AA ID. Assuming Main AA ID format matches standard AA.
+                                # If Main AA is 'owner:start', then ID is auto_attendant_owner_start
+                                main_aa_id_raw = f"auto_attendant_{owner}_{start}"
+                                node_parent = self._safe_id(main_aa_id_raw)
+
+                        if not is_intro:
+                            node_label = f"{name} ({start})"
+                    else:
+                        node_label = f"Auto Attendant: {prompt}"
+                except Exception as e:
+                    logger.warning(f"Error fetching AA details: {e}")
+                    node_label = f"Auto Attendant: {prompt}"
+            else:
+                node_label = f"Auto Attendant: {target_name}"
+
+        elif target_type_hint == "call_queue":
+            bg_color = "#FFA500"  # Orange for Queue
+            node_label = f"Queue: {target_name}"
+
+        elif target_type_hint == "voicemail":
+            bg_color = "#A9A9A9"  # Dark Grey for Voicemail
+            if "vmail_" in target_name:
+                node_label = f"Voicemail ({target_name.replace('vmail_', '')})"
+
+        elif target_type_hint == "offnet":
+            bg_color = "#90EE90"  # Light Green for External
+            node_label = f"External: {format_phone_number(target_name)}"
+            node_link = None
+
+        elif target_type_hint == "hangup":
+            bg_color = "#FF6347"  # Tomato for Hangup
+            node_label = "Hangup"
+            node_link = None
+
+        elif target_type_hint == "other":
+            bg_color = "#D3D3D3"  # Light Grey
+            node_label = f"Other: {target_name}"
+            node_link = None
+
+        elif target_type_hint == "directory":
+            bg_color = "#DA70D6"  # Orchid for Directory
+            node_label = "Directory"
+            node_link = None
+
+        elif target_type_hint == "conference":
+            bg_color = "#EE82EE"  # Violet for Conference
+            node_label = f"Conference Bridge: {target_name}"
+            # Link is handled by generate_portal_link ("conference")
+
+        elif target_type_hint == "device":
+            bg_color = "#D8BFD8"  # Thistle
+            node_label = f"Device: {target_name}"
+            node_link = None
+
+        return _Node(
+            id=node_id,
+            label=node_label,
+            type=target_type_hint,
+            bg=bg_color,
+            link=node_link,
+            parent=node_parent,
+            details=node_details,
+        )
+
+    def _rule_targets(self, rule: NSAnswerRule) -> List[Tuple[str, Union[str, int]]]:
+        """Returns (action, raw target) for each enabled destination of a rule."""
+        targets: List[Tuple[str, Union[str, int]]] = []
+
+        # Simultaneous Ring
+        if rule.simultaneous_ring and rule.simultaneous_ring.enabled == "yes":
+            for target in rule.simultaneous_ring.parameters:
+                if target:
+                    targets.append(("Simultaneous Ring", target))
+
+        # Forwarding
+        forward_mappings = [
+            ("Forward Always", rule.forward_always),
+            ("Forward Busy", rule.forward_on_busy),
+            ("Forward No Answer", rule.forward_no_answer),
+            ("Forward Offline", rule.forward_when_unregistered),
+        ]
+
+        for fwd_name, fwd_logic in forward_mappings:
+            if fwd_logic and fwd_logic.enabled == "yes" and fwd_logic.parameters:
+                target = fwd_logic.parameters[0]
+                if target:
+                    targets.append((fwd_name, target))
+
+        return targets
 
-    async def _expand_node(
-        self, node_name: str, node_type: str
-    ) -> List[Tuple[str, str, str, Dict[str, Any], bool, Optional[str]]]:
-        # Returns (child_name, child_type, label, extra_data, should_expand, parent_hint)
-        children = []
+    async def _expand_node(self, node_name: str, node_type: str) -> List[_Child]:
+        children: List[_Child] = []
 
         if node_type == "user":
-            if node_name in self.rules_cache:
-                rules = self.rules_cache[node_name]
-            else:
-                rules = await self.client.get_answer_rules(self.domain, node_name)
-                self.rules_cache[node_name] = rules
+            rules = await self._fetch_once(
+                self.rules_cache,
+                "rules",
+                node_name,
+                lambda: self.client.get_answer_rules(self.domain, node_name),
+            )
 
             for rule in rules:
                 tf_label = rule.time_frame
@@ -417,55 +1225,20 @@ class GraphBuilder:
                     "time_range_data": rule.time_range_data,
                 }
 
-                def format_edge_label(action: str) -> str:
-                    return f"{action} (Timeframe: {tf_label})"
-
-                # Simultaneous Ring
-                if rule.simultaneous_ring and rule.simultaneous_ring.enabled == "yes":
-                    for target in rule.simultaneous_ring.parameters:
-                        if target:
-                            lbl = format_edge_label("Simultaneous Ring")
-                            child_type, child_name, child_parent = (
-                                self._get_type_and_name(target)
-                            )
-
-                            if child_type == "auto_attendant":
-                                # Scoping: If AA target doesn't have ':', assume it belongs to current node (user)
-                                if ":" not in child_name:
-                                    child_name = f"{node_name}:{child_name}"
-
-                            children.append(
-                                (child_name, child_type, lbl, extra, True, child_parent)
-                            )
-
-                # Forwarding
-                forward_mappings = [
-                    ("Forward Always", rule.forward_always),
-                    ("Forward Busy", rule.forward_on_busy),
-                    ("Forward No Answer", rule.forward_no_answer),
-                    ("Forward Offline", rule.forward_when_unregistered),
-                ]
-
-                for fwd_name, fwd_logic in forward_mappings:
-                    if (
-                        fwd_logic
-                        and fwd_logic.enabled == "yes"
-                        and fwd_logic.parameters
-                    ):
-                        target = fwd_logic.parameters[0]
-                        if target:
-                            lbl = format_edge_label(fwd_name)
-                            child_type, child_name, child_parent = (
-                                self._get_type_and_name(target)
-                            )
+                for action, target in self._rule_targets(rule):
+                    lbl = f"{action} (Timeframe: {tf_label})"
+                    child_type, child_name, child_parent = await self._resolve_target(
+                        target
+                    )
 
-                            if child_type == "auto_attendant":
-                                if ":" not in child_name:
-                                    child_name = f"{node_name}:{child_name}"
+                    if child_type == "auto_attendant":
+                        # Scoping: If AA target doesn't have ':', assume it belongs to current node (user)
+                        if ":" not in child_name:
+                            child_name = f"{node_name}:{child_name}"
 
-                            children.append(
-                                (child_name, child_type, lbl, extra, True, child_parent)
-                            )
+                    children.append(
+                        (child_name, child_type, lbl, extra, True, child_parent)
+                    )
 
         elif node_type == "auto_attendant":
             if ":" in node_name:
@@ -477,14 +1250,14 @@ class GraphBuilder:
             logger.debug(f"Expanding Auto Attendant: owner={owner}, prompt={prompt}")
             try:
                 # Use cache if available (populated by _process_did_path or previous calls)
-                cache_key = f"{owner}:{prompt}"
-                if cache_key in self.aa_prompts_cache:
-                    aa_response = self.aa_prompts_cache[cache_key]
-                else:
-                    aa_response = await self.client.get_auto_attendant_prompts(
+                aa_response = await self._fetch_once(
+                    self.aa_prompts_cache,
+                    "aa",
+                    f"{owner}:{prompt}",
+                    lambda: self.client.get_auto_attendant_prompts(
                         self.domain, owner, prompt
-                    )
-                    self.aa_prompts_cache[cache_key] = aa_response
+                    ),
+                )
 
                 if aa_response:
                     # Check if this node is actually an Intro Greeting
@@ -511,7 +1284,7 @@ class GraphBuilder:
                         # Usually owner + starting_prompt
                         child_name = f"{owner}:{main_prompt}"
                         children.append(
-                            (child_name, "auto_attendant", "Next", {}, True, None)
+                            (child_name, "auto_attendant", "Next", None, True, None)
                         )
 
                     elif aa_response.auto_attendant:
@@ -542,7 +1315,7 @@ class GraphBuilder:
                                             node_name,
                                             "auto_attendant",
                                             label,
-                                            {},
+                                            None,
                                             False,
                                             None,
                                         )
@@ -576,7 +1349,7 @@ class GraphBuilder:
                                             synthetic_id,
                                             "auto_attendant",
                                             label,
-                                            {},
+                                            None,
                                             True,
                                             None,
                                         )
@@ -591,7 +1364,7 @@ class GraphBuilder:
                             app = option.destination_application
                             if app and "sip:start" in app and "directory" in app:
                                 children.append(
-                                    ("Directory", "directory", label, {}, False, None)
+                                    ("Directory", "directory", label, None, False, None)
                                 )
                                 continue
 
@@ -600,7 +1373,7 @@ class GraphBuilder:
 
                             # Use _get_type_and_name on the raw destination first
                             child_type, child_name, child_parent = (
-                                self._get_type_and_name(dest or "")
+                                await self._resolve_target(dest or "")
                             )
 
                             if app == "hangup":
@@ -627,7 +1400,7 @@ class GraphBuilder:
                                         child_name,
                                         child_type,
                                         label,
-                                        {},
+                                        None,
                                         True,
                                         child_parent,
                                     )
@@ -638,18 +1411,19 @@ class GraphBuilder:
         elif node_type == "call_queue":
             logger.debug(f"Expanding Call Queue: {node_name}")
             try:
-                if node_name in self.queue_agents_cache:
-                    agents = self.queue_agents_cache[node_name]
-                else:
-                    agents = await self.client.get_call_queue_agents(
-                        self.domain, node_name
-                    )
-                    self.queue_agents_cache[node_name] = agents
+                agents = await self._fetch_once(
+                    self.queue_agents_cache,
+                    "queue",
+                    node_name,
+                    lambda: self.client.get_call_queue_agents(self.domain, node_name),
+                )
 
                 for agent in agents:
                     if agent.user:
                         # Agents are terminal in the context of a queue
-                        children.append((agent.user, "user", "Agent", {}, False, None))
+                        children.append(
+                            (agent.user, "user", "Agent", None, False, None)
+                        )
             except Exception as e:
                 logger.warning(f"Failed to fetch agents for queue {node_name}: {e}")
 
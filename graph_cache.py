@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedGraph:
+    __slots__ = ("value", "built_at")
+
+    def __init__(self, value: Any, built_at: float):
+        self.value = value
+        self.built_at = built_at
+
+
+class GraphCache:
+    """
+    Finished graphs keyed by (domain, api_url, auth scope), served with
+    stale-while-revalidate: fresh entries are returned as-is, stale ones are
+    returned immediately while a background task rebuilds them, and only
+    missing or expired entries make the caller wait for a crawl.
+
+    Each graph may also keep an index, e.g. the GraphBuilder that produced
+    it, so it can later be updated instead of rebuilt from scratch.
+    """
+
+    def __init__(
+        self,
+        fresh_ttl: float = 60.0,
+        stale_ttl: float = 600.0,
+        max_entries: int = 100,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fresh_ttl = fresh_ttl
+        # How long past fresh_ttl a graph may still be served while rebuilding
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self._entries: "OrderedDict[Hashable, _CachedGraph]" = OrderedDict()
+        # Dropped along with their graph
+        self._indexes: Dict[Hashable, Any] = {}
+        # One build per key at a time, shared by waiters and background refresh
+        self._builds: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        # Keys whose running build is a refresh, so later refreshes may join it
+        self._refreshing: Set[Hashable] = set()
+        # Strong references so background rebuilds aren't garbage collected
+        self._background: Set["asyncio.Task[Any]"] = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get_or_build(
+        self,
+        key: Hashable,
+        build: Callable[[], Awaitable[Any]],
+        refresh: bool = False,
+    ) -> Any:
+        """Returns the cached graph for key, building it with build() as needed."""
+        entry = self._entries.get(key)
+        if entry is not None and not refresh:
+            age = self.clock() - entry.built_at
+            if age < self.fresh_ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+
+            if age < self.fresh_ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._builds:
+                    logger.info(f"Serving stale graph for {key}; rebuilding.")
+                    task = asyncio.ensure_future(self._build(key, build))
+                    self._background.add(task)
+                    task.add_done_callback(self._background_done)
+                return entry.value
+
+        self.misses += 1
+        return await self._build(key, build, refresh=refresh)
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Returns the graph for key if it is still fresh, without building."""
+        entry = self._entries.get(key)
+        if entry is None or self.clock() - entry.built_at >= self.fresh_ttl:
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: Hashable, value: Any):
+        """Stores a graph built outside get_or_build(), e.g. by a stream."""
+        self._store(key, value)
+
+    def set_index(self, key: Hashable, index: Any):
+        self._indexes[key] = index
+
+    def get_index(self, key: Hashable) -> Optional[Any]:
+        """Returns the index stored for key's graph, fresh or not."""
+        return self._indexes.get(key) if key in self._entries else None
+
+    async def rebuild(self, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Stores the result of build() as key's graph. Unlike get_or_build()
+        it doesn't join a build already running for key, which may predate
+        whatever prompted the rebuild, but starts once that one is done.
+        """
+        return await self._build(key, build, join=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._indexes.pop(key, None)
+
+    async def _build(
+        self,
+        key: Hashable,
+        build: Callable[[], Awaitable[Any]],
+        join: bool = True,
+        refresh: bool = False,
+    ) -> Any:
+        pending = self._builds.get(key)
+        # A refresh must not be answered from cached API responses, so it
+        # only joins another refresh
+        while pending is not None and not (
+            join and (not refresh or key in self._refreshing)
+        ):
+            # Its waiters store its result first, so ours lands last
+            await asyncio.wait([pending])
+            pending = self._builds.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(build())
+            self._builds[key] = pending
+            if refresh:
+                self._refreshing.add(key)
+            try:
+                value = await asyncio.shield(pending)
+            finally:
+                self._builds.pop(key, None)
+                self._refreshing.discard(key)
+            self._store(key, value)
+            return value
+
+        return await asyncio.shield(pending)
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries.pop(key, None)
+        self._entries[key] = _CachedGraph(value, self.clock())
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            self._indexes.pop(oldest, None)
+
+    def _background_done(self, task: "asyncio.Task[Any]"):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # Keep serving the old graph; the next stale hit retries
+            logger.warning(f"Background graph rebuild failed: {task.exception()}")
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class GraphJob:
+    __slots__ = (
+        "id",
+        "key",
+        "domain",
+        "build",
+        "state",
+        "result",
+        "error",
+        "finished_at",
+    )
+
+    def __init__(
+        self, key: Hashable, domain: str, build: Callable[[str], Awaitable[Any]]
+    ):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.domain = domain
+        # Called with the job id, which doubles as the build_id for progress.
+        # Dropped once the job finishes.
+        self.build: Optional[Callable[[str], Awaitable[Any]]] = build
+        self.state = "queued"  # queued, running, done, failed
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+
+
+class JobQueue:
+    """
+    Background graph builds for clients that can't hold a request open for a
+    whole crawl. At most max_running jobs build at once; up to max_queued
+    more wait their turn. A job submitted while an identical one (same key)
+    is still queued or running gets that job back instead. Finished jobs
+    are dropped result_ttl seconds after completion.
+    """
+
+    def __init__(
+        self,
+        max_running: int = 2,
+        max_queued: int = 50,
+        result_ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_running = max(1, max_running)
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.clock = clock
+
+        self._jobs: Dict[str, GraphJob] = {}
+        # Queued or running job per key, for de-duplication
+        self._active: Dict[Hashable, GraphJob] = {}
+        self._queue: "Optional[asyncio.Queue[GraphJob]]" = None
+        self._workers: List["asyncio.Task[None]"] = []
+
+    def submit(
+        self, key: Hashable, domain: str, build: Callable[[str], Awaitable[Any]]
+    ) -> GraphJob:
+        self._prune()
+
+        active = self._active.get(key)
+        if active is not None:
+            return active
+
+        if self._queue is None:
+            # Created on first use so they bind to the running event loop
+            self._queue = asyncio.Queue()
+            self._workers = [
+                asyncio.ensure_future(self._work(self._queue))
+                for _ in range(self.max_running)
+            ]
+
+        if self._queue.qsize() >= self.max_queued:
+            raise HTTPException(
+                status_code=503, detail="Too many graph jobs queued; try again later."
+            )
+
+        job = GraphJob(key, domain, build)
+        self._jobs[job.id] = job
+        self._active[key] = job
+        self._queue.put_nowait(job)
+        logger.info(f"Queued graph job {job.id} for {domain}.")
+        return job
+
+    def get(self, job_id: str) -> Optional[GraphJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    async def aclose(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def _work(self, queue: "asyncio.Queue[GraphJob]"):
+        while True:
+            job = await queue.get()
+            build = job.build
+            assert build is not None  # Only finished jobs have dropped it
+            job.state = "running"
+            try:
+                job.result = await build(job.id)
+                job.state = "done"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.error = e.detail if isinstance(e, HTTPException) else str(e)
+                job.state = "failed"
+                logger.error(f"Graph job {job.id} failed: {job.error}")
+            finally:
+                job.build = None
+                job.finished_at = self.clock()
+                self._active.pop(job.key, None)
+
+    def _prune(self):
+        cutoff = self.clock() - self.result_ttl
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
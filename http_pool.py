@@ -0,0 +1,62 @@
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from ns_client import create_http_client, normalize_api_url
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientPool:
+    """
+    Keeps one long-lived httpx.AsyncClient per upstream host so /graph
+    requests reuse open (keep-alive) connections instead of paying a new
+    TCP + TLS handshake each time.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+        http2: bool = False,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.http2 = http2
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @staticmethod
+    def host_key(api_url: Optional[str]) -> str:
+        """Returns scheme://host[:port] for an API URL, as NSClient would call it."""
+        if not api_url:
+            return ""
+        parsed = urlparse(normalize_api_url(api_url))
+        return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+    def get(self, api_url: Optional[str]) -> httpx.AsyncClient:
+        """Returns the shared client for api_url's host, creating it if needed."""
+        key = self.host_key(api_url)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            logger.info(f"Opening pooled HTTP client for {key or '<no host>'}")
+            client = create_http_client(
+                timeout=self.timeout, limits=self.limits, http2=self.http2
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self):
+        """Closes every pooled client. Called on application shutdown."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+        logger.info(f"Closed {len(clients)} pooled HTTP clients.")
@@ -1,19 +1,37 @@
 import argparse
+import asyncio
+import json
 import logging
 import os
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
 
-import httpx
 import uvicorn
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
+from build_progress import ProgressTracker
+from cluster_health import ClusterHealth, cluster_urls
 from config import settings
-from graph_builder import GraphBuilder
-from models import CytoscapeElement
+from graph_builder import GraphBuilder, Resource, combine_graphs
+from graph_cache import GraphCache
+from graph_jobs import JobQueue
+from http_pool import HTTPClientPool
+from models import (
+    CytoscapeElement,
+    DIDSummary,
+    GraphBatch,
+    GraphInvalidation,
+    GraphJobStatus,
+    cytoscape_graph,
+)
 from ns_client import NSClient
+from rate_limit import HostLimiters
+from response_cache import ResponseCache, token_identity
 from security import DomainWhitelist
+from utils import format_phone_number
 
 # Setup Logging
 LOG_LEVEL = logging.INFO
@@ -25,7 +43,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="NetSapiens Call Flow Visualizer")
+http_pool = HTTPClientPool(
+    max_connections=settings.NS_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.NS_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=settings.NS_HTTP_KEEPALIVE_EXPIRY,
+    timeout=settings.NS_HTTP_TIMEOUT,
+    http2=settings.NS_HTTP2,
+)
+
+host_limiters = HostLimiters(
+    rate=settings.NS_RATE_LIMIT,
+    burst=settings.NS_RATE_BURST,
+    max_in_flight=settings.NS_MAX_IN_FLIGHT,
+    overrides=settings.NS_HOST_LIMITS,
+)
+
+cluster_health = ClusterHealth(
+    failure_threshold=settings.NS_CIRCUIT_FAILURES,
+    reset_timeout=settings.NS_CIRCUIT_RESET,
+)
+
+response_cache = (
+    ResponseCache(
+        max_bytes=settings.NS_CACHE_MAX_BYTES,
+        default_ttl=settings.NS_CACHE_TTL,
+        ttls=settings.NS_CACHE_TTLS,
+    )
+    if settings.NS_CACHE_ENABLED
+    else None
+)
+
+graph_cache = (
+    GraphCache(
+        fresh_ttl=settings.GRAPH_CACHE_TTL,
+        stale_ttl=settings.GRAPH_CACHE_STALE_TTL,
+        max_entries=settings.GRAPH_CACHE_MAX_ENTRIES,
+    )
+    if settings.GRAPH_CACHE_ENABLED
+    else None
+)
+
+progress = ProgressTracker(retention=settings.GRAPH_PROGRESS_RETENTION)
+
+jobs = JobQueue(
+    max_running=settings.GRAPH_JOBS_MAX_RUNNING,
+    max_queued=settings.GRAPH_JOBS_MAX_QUEUED,
+    result_ttl=settings.GRAPH_JOBS_RESULT_TTL,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await jobs.aclose()
+    await http_pool.aclose()
+
+
+app = FastAPI(title="NetSapiens Call Flow Visualizer", lifespan=lifespan)
 
 templates = Jinja2Templates(directory="templates")
 
@@ -53,42 +127,530 @@ async def get_js_loader(request: Request):
     )
 
 
+def create_client(
+    token: str, api_url: Optional[str], refresh: bool = False
+) -> NSClient:
+    """An API client on the shared pools. refresh bypasses cached API responses."""
+    return NSClient(
+        token,
+        api_url,
+        client=http_pool.get(api_url),
+        cache=response_cache,
+        refresh_cache=refresh,
+        page_concurrency=settings.NS_PAGE_CONCURRENCY,
+        retries=settings.NS_RETRIES,
+        retry_backoff=settings.NS_RETRY_BACKOFF,
+        retry_max_delay=settings.NS_RETRY_MAX_DELAY,
+        retry_budget=settings.NS_RETRY_BUDGET,
+        limiters=host_limiters,
+        fallback_urls=cluster_urls(api_url, settings.NS_CLUSTERS),
+        health=cluster_health,
+    )
+
+
+def create_builder(
+    domain: str,
+    token: str,
+    api_url: Optional[str],
+    refresh: bool = False,
+    client: Optional[NSClient] = None,
+) -> GraphBuilder:
+    """
+    Sets up a crawl of one domain. refresh bypasses cached API responses.
+    client may be shared by several crawls; by default each gets its own.
+    """
+    return GraphBuilder(
+        client or create_client(token, api_url, refresh=refresh),
+        domain,
+        max_concurrency=settings.GRAPH_MAX_CONCURRENCY,
+        prefetch_rules=settings.GRAPH_PREFETCH_ANSWER_RULES,
+        prefetch_max_users=settings.GRAPH_PREFETCH_MAX_USERS,
+    )
+
+
+async def build_graph(
+    domain: str,
+    token: str,
+    api_url: Optional[str],
+    refresh: bool = False,
+    build_id: Optional[str] = None,
+    client: Optional[NSClient] = None,
+) -> List[CytoscapeElement]:
+    """Crawls one domain's call flows. refresh bypasses cached API responses."""
+    builder = create_builder(domain, token, api_url, refresh=refresh, client=client)
+    client = builder.client
+    if build_id:
+        progress.attach(build_id, builder)
+
+    graph = await builder.build()
+    logger.info(f"Successfully built graph for {domain} with {len(graph)} elements.")
+    if graph_cache is not None:
+        # Kept so later changes can be applied without a full crawl
+        graph_cache.set_index(graph_key(domain, token, api_url), builder)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        graph_json = json.dumps([g.model_dump() for g in graph], indent=2)
+        logger.debug(f"Final Graph JSON for {domain}:\n{graph_json}")
+
+        client.log_stats()
+        if response_cache:
+            logger.debug(f"Response Cache (process): {response_cache.stats()}")
+        logger.debug(f"Rate Limiters (process): {host_limiters.stats()}")
+        logger.debug(f"API Endpoint Health (process): {cluster_health.stats()}")
+
+    return graph
+
+
+def graph_key(domain: str, token: str, api_url: Optional[str]) -> Tuple:
+    return (domain, http_pool.host_key(api_url), token_identity(token))
+
+
+async def update_graph(
+    domain: str,
+    token: str,
+    api_url: Optional[str],
+    changed: Optional[List[Resource]] = None,
+    build_id: Optional[str] = None,
+) -> Optional[List[CytoscapeElement]]:
+    """
+    Updates the cached build of a domain, re-walking only what changed (see
+    GraphBuilder.update). Returns None when there is no cached build or the
+    change needs a full crawl.
+    """
+    if graph_cache is None:
+        return None
+    builder = graph_cache.get_index(graph_key(domain, token, api_url))
+    if builder is None:
+        return None
+    if build_id:
+        progress.attach(build_id, builder)
+
+    # Revalidates cached responses, so unchanged resources cost a 304
+    graph = await builder.update(changed, client=create_client(token, api_url, True))
+    if graph is not None:
+        logger.info(f"Updated graph for {domain} with {len(graph)} elements.")
+        if logger.isEnabledFor(logging.DEBUG):
+            builder.client.log_stats()
+    return graph
+
+
+async def get_or_build_graph(
+    domain: str,
+    token: str,
+    api_url: Optional[str],
+    refresh: bool = False,
+    build_id: Optional[str] = None,
+    client: Optional[NSClient] = None,
+) -> List[CytoscapeElement]:
+    """Returns the domain's graph from the graph cache, crawling it as needed."""
+
+    async def build():
+        if not refresh:
+            graph = await update_graph(domain, token, api_url, build_id=build_id)
+            if graph is not None:
+                return graph
+        return await build_graph(
+            domain, token, api_url, refresh=refresh, build_id=build_id, client=client
+        )
+
+    if build_id:
+        progress.start(build_id)
+    error = None
+    try:
+        if graph_cache is None:
+            return await build()
+
+        key = graph_key(domain, token, api_url)
+        return await graph_cache.get_or_build(key, build, refresh=refresh)
+    except Exception as e:
+        error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+        raise
+    finally:
+        if build_id:
+            progress.finish(build_id, error)
+
+
 @app.get("/graph", response_model=List[CytoscapeElement])
 async def get_graph(
     domain: str,
     token: str,
     api_url: Optional[str] = Query(None, description="Primary NetSapiens API URL"),
+    refresh: bool = Query(False, description="Force a rebuild, skipping caches"),
+    build_id: Optional[str] = Query(
+        None, max_length=64, description="Follow on /graph/progress/{build_id}"
+    ),
 ):
     logger.info(f"Received request for domain: {domain}")
 
     if api_url:
         whitelist.validate_or_raise(api_url)
 
-    async with httpx.AsyncClient(timeout=10.0, verify=False) as http_client:
-        client = NSClient(token, api_url, client=http_client)
-        builder = GraphBuilder(client, domain)
+    try:
+        graph = await get_or_build_graph(
+            domain, token, api_url, refresh=refresh, build_id=build_id
+        )
+    except HTTPException as e:
+        logger.warning(f"HTTP Exception: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"Error building graph: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        try:
-            graph = await builder.build()
-            logger.info(
-                f"Successfully built graph for {domain} with {len(graph)} elements."
-            )
+    # response_model still documents the schema; returning a Response skips
+    # FastAPI validating and encoding every element again
+    return Response(cytoscape_graph.dump_json(graph), media_type="application/json")
+
+
+@app.get("/graph/dids", response_model=List[DIDSummary])
+async def list_dids(
+    domain: str,
+    token: str,
+    api_url: Optional[str] = Query(None, description="Primary NetSapiens API URL"),
+):
+    """The domain's phone numbers and where they route, without crawling."""
+    if api_url:
+        whitelist.validate_or_raise(api_url)
 
-            if logger.isEnabledFor(logging.DEBUG):
-                import json
+    try:
+        dids = await create_client(token, api_url).get_dids(domain) or []
+    except HTTPException as e:
+        logger.warning(f"HTTP Exception: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"Error listing DIDs: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return [
+        DIDSummary(
+            number=did.phonenumber,
+            label=format_phone_number(did.phonenumber),
+            destination=did.dest,
+            application=did.application,
+        )
+        for did in dids
+    ]
+
+
+@app.get("/graph/did/{number}", response_model=List[CytoscapeElement])
+async def get_did_graph(
+    number: str,
+    domain: str,
+    token: str,
+    api_url: Optional[str] = Query(None, description="Primary NetSapiens API URL"),
+    refresh: bool = Query(False, description="Skip cached graphs and API responses"),
+):
+    """
+    The call flow of a single phone number. Cut from the cached domain graph
+    when it is fresh, otherwise crawled on its own.
+    """
+    logger.info(f"Received request for DID {number} in domain: {domain}")
 
-                graph_json = json.dumps([g.model_dump() for g in graph], indent=2)
-                logger.debug(f"Final Graph JSON for {domain}:\n{graph_json}")
+    if api_url:
+        whitelist.validate_or_raise(api_url)
 
-                client.log_stats()
+    graph = None
+    key = graph_key(domain, token, api_url)
+    if graph_cache is not None and not refresh and graph_cache.peek(key) is not None:
+        builder = graph_cache.get_index(key)
+        if builder is not None:
+            graph = await builder.subgraph(number)
+            if graph_cache.get_index(key) is not builder:
+                # Dropped or replaced while we waited, e.g. by a failed update
+                graph = None
 
-            return graph
+    if graph is None:
+        try:
+            builder = create_builder(domain, token, api_url, refresh=refresh)
+            graph = await builder.build_did(number)
         except HTTPException as e:
             logger.warning(f"HTTP Exception: {e.detail}")
             raise e
         except Exception as e:
-            logger.error(f"Error building graph: {e}", exc_info=True)
+            logger.error(f"Error building graph for DID {number}: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
+        if graph is None:
+            raise HTTPException(
+                status_code=404, detail=f"No phone number {number} in {domain}."
+            )
+
+    return Response(cytoscape_graph.dump_json(graph), media_type="application/json")
+
+
+async def build_graphs(
+    domains: List[str],
+    token: str,
+    api_url: Optional[str],
+    refresh: bool = False,
+) -> Tuple[Dict[str, List[CytoscapeElement]], Dict[str, str]]:
+    """
+    Builds several domains' graphs concurrently, at most
+    GRAPH_BATCH_MAX_CONCURRENCY at a time, through one shared NSClient so
+    they share its connections and in-flight requests. Cached graphs are
+    reused. Returns (graphs, errors), each keyed by domain; one domain
+    failing doesn't fail the others.
+    """
+    domains = list(dict.fromkeys(domains))
+    client = create_client(token, api_url, refresh=refresh)
+    # The retry budget is per build; the shared client serves them all
+    client.retry_budget *= max(1, len(domains))
+    semaphore = asyncio.Semaphore(max(1, settings.GRAPH_BATCH_MAX_CONCURRENCY))
+
+    async def build(domain: str) -> List[CytoscapeElement]:
+        async with semaphore:
+            return await get_or_build_graph(
+                domain, token, api_url, refresh=refresh, client=client
+            )
+
+    results = await asyncio.gather(
+        *(build(domain) for domain in domains), return_exceptions=True
+    )
+
+    graphs: Dict[str, List[CytoscapeElement]] = {}
+    errors: Dict[str, str] = {}
+    for domain, result in zip(domains, results):
+        if isinstance(result, HTTPException):
+            errors[domain] = str(result.detail)
+        elif isinstance(result, Exception):
+            logger.error(f"Error building graph for {domain}: {result}")
+            errors[domain] = str(result)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            graphs[domain] = result
+    logger.info(
+        f"Batch built {len(graphs)} of {len(domains)} graphs "
+        f"with {client.total_calls} API calls."
+    )
+    return graphs, errors
+
+
+@app.get("/graph/batch", response_model=GraphBatch)
+async def get_graph_batch(
+    token: str,
+    domains: List[str] = Query(..., description="Domains to build, repeated"),
+    api_url: Optional[str] = Query(None, description="Primary NetSapiens API URL"),
+    combine: bool = Query(
+        False, description="One graph with domain-prefixed ids instead of one each"
+    ),
+    refresh: bool = Query(False, description="Force a rebuild, skipping caches"),
+):
+    """
+    Graphs for several domains of one API in one request, e.g. for a
+    reseller view. Domains that fail are listed under errors.
+    """
+    logger.info(f"Received batch request for {len(domains)} domains")
+
+    if len(set(domains)) > settings.GRAPH_BATCH_MAX_DOMAINS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.GRAPH_BATCH_MAX_DOMAINS} domains per request.",
+        )
+    if api_url:
+        whitelist.validate_or_raise(api_url)
+
+    graphs, errors = await build_graphs(domains, token, api_url, refresh=refresh)
+
+    batch = (
+        GraphBatch(graph=combine_graphs(graphs), errors=errors)
+        if combine
+        else GraphBatch(graphs=graphs, errors=errors)
+    )
+    return Response(batch.model_dump_json(), media_type="application/json")
+
+
+def job_status(job) -> GraphJobStatus:
+    return GraphJobStatus(
+        job_id=job.id,
+        domain=job.domain,
+        state=job.state,
+        error=job.error,
+        result=job.result,
+    )
+
+
+@app.post("/graph/jobs", response_model=GraphJobStatus, status_code=202)
+async def submit_graph_job(
+    domain: str,
+    token: str,
+    api_url: Optional[str] = Query(None, description="Primary NetSapiens API URL"),
+    refresh: bool = Query(False, description="Force a rebuild, skipping caches"),
+):
+    """
+    Starts building the graph in the background and returns the job to poll
+    on GET /graph/jobs/{job_id}. The job id also works as a build_id for
+    /graph/progress. An identical job still in progress, refresh included,
+    is returned as-is.
+    """
+    logger.info(f"Received job request for domain: {domain}")
+
+    if api_url:
+        whitelist.validate_or_raise(api_url)
+
+    def build(job_id: str):
+        return get_or_build_graph(
+            domain, token, api_url, refresh=refresh, build_id=job_id
+        )
+
+    # A refresh must not be answered by a running job that reads caches
+    key = (*graph_key(domain, token, api_url), refresh)
+    job = jobs.submit(key, domain, build)
+    progress.start(job.id)
+    return job_status(job)
+
+
+@app.get("/graph/jobs/{job_id}", response_model=GraphJobStatus)
+async def get_graph_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return job_status(job)
+
+
+@app.get("/graph/stream")
+async def stream_graph(
+    domain: str,
+    token: str,
+    api_url: Optional[str] = Query(None, description="Primary NetSapiens API URL"),
+    refresh: bool = Query(False, description="Skip cached API responses"),
+    build_id: Optional[str] = Query(
+        None, max_length=64, description="Follow on /graph/progress/{build_id}"
+    ),
+):
+    """
+    Streams the graph as NDJSON, one element per line, while it is being
+    crawled. A fresh cached graph is streamed as-is, and a finished crawl is
+    cached for /graph exactly as it was sent. Once the first line is sent the status code can't
+    change, so a failure mid-crawl is reported as a final {"error": ...} line.
+    """
+    logger.info(f"Received stream request for domain: {domain}")
+
+    if api_url:
+        whitelist.validate_or_raise(api_url)
+
+    key = graph_key(domain, token, api_url)
+    cached = graph_cache.peek(key) if graph_cache and not refresh else None
+    builder = create_builder(domain, token, api_url, refresh=refresh)
+    if build_id:
+        progress.start(build_id)
+        if cached is None:
+            progress.attach(build_id, builder)
+
+    async def lines():
+        error = None
+        try:
+            if cached is not None:
+                for element in cached:
+                    yield element.model_dump_json() + "\n"
+                return
+
+            # Cached as sent: a shared node's parent follows discovery order
+            # here, which needn't match builder.elements()
+            streamed: List[CytoscapeElement] = []
+            async for element in builder.stream():
+                streamed.append(element)
+                yield element.model_dump_json() + "\n"
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"Error streaming graph: {error}", exc_info=True)
+            yield json.dumps({"error": error}) + "\n"
+            return
+        finally:
+            if build_id:
+                progress.finish(build_id, error)
+
+        logger.info(f"Streamed graph for {domain} with {len(streamed)} elements.")
+        if graph_cache is not None:
+            graph_cache.put(key, streamed)
+            graph_cache.set_index(key, builder)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/graph/invalidate", response_model=GraphInvalidation)
+async def invalidate_graph(
+    domain: str,
+    token: str,
+    api_url: Optional[str] = Query(None, description="Primary NetSapiens API URL"),
+    users: List[str] = Query([], description="Users whose answer rules changed"),
+    auto_attendants: List[str] = Query(
+        [], description="Auto attendants that changed, as owner:prompt"
+    ),
+    queues: List[str] = Query([], description="Call queues whose agents changed"),
+):
+    """
+    Applies changes to the cached graph by re-walking only the call flows
+    that use the named resources. Without a cached build to update, the
+    cached graph is dropped and the next /graph request crawls in full.
+    """
+    changed: List[Resource] = (
+        [("rules", user) for user in users]
+        + [("aa", aa) for aa in auto_attendants]
+        + [("queue", queue) for queue in queues]
+    )
+    if not changed:
+        raise HTTPException(
+            status_code=400, detail="Name at least one user, auto attendant or queue."
+        )
+    if any(kind == "aa" and ":" not in name for kind, name in changed):
+        raise HTTPException(
+            status_code=400, detail="Auto attendants are given as owner:prompt."
+        )
+
+    if api_url:
+        whitelist.validate_or_raise(api_url)
+
+    key = graph_key(domain, token, api_url)
+    cache = graph_cache
+    if cache is None or cache.get_index(key) is None:
+        if cache is not None:
+            cache.invalidate(key)
+        return GraphInvalidation(domain=domain, incremental=False)
+
+    dids: Optional[List[str]] = None
+
+    async def update():
+        nonlocal dids
+        builder = cache.get_index(key)
+        if builder is None:
+            # Dropped by the build we waited for; crawl afresh
+            return await build_graph(domain, token, api_url)
+        dids = builder.dependent_dids(changed)
+        try:
+            return await update_graph(domain, token, api_url, changed=changed)
+        except Exception:
+            # The build may be half updated; crawl afresh next time
+            cache.invalidate(key)
+            raise
+
+    # A build already running for the key may have read the old resources
+    await cache.rebuild(key, update)
+    builder = cache.get_index(key)
+    return GraphInvalidation(
+        domain=domain,
+        incremental=dids is not None,
+        dids=[did.removeprefix("did_") for did in dids or []],
+        api_calls=builder.client.total_calls if builder is not None else 0,
+    )
+
+
+@app.get("/graph/progress/{build_id}")
+async def graph_progress(build_id: str):
+    """
+    Server-sent events with the counters of the build started with this
+    build_id, sent as they change until the build is done or failed.
+    """
+
+    async def events():
+        async for snapshot in progress.watch(
+            build_id, interval=settings.GRAPH_PROGRESS_INTERVAL
+        ):
+            yield f"data: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Optional, Union
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 # --- Cytoscape Elements ---
 
@@ -31,6 +31,41 @@ class CytoscapeElement(BaseModel):
     data: Union[NodeData, EdgeData]
 
 
+# Serializes a whole graph straight to JSON bytes. The builder's elements
+# are already valid, so this skips response_model re-validation.
+cytoscape_graph = TypeAdapter(List[CytoscapeElement])
+
+
+class GraphJobStatus(BaseModel):
+    job_id: str
+    domain: str
+    state: str  # queued, running, done, failed
+    error: Optional[str] = None
+    result: Optional[List[CytoscapeElement]] = None  # Set once done
+
+
+class DIDSummary(BaseModel):
+    number: str
+    label: str  # Formatted for display, e.g. (555) 000-1000
+    destination: Optional[str] = None
+    application: Optional[str] = None
+
+
+class GraphBatch(BaseModel):
+    # Per domain, or None when the graphs were combined into graph
+    graphs: Optional[Dict[str, List[CytoscapeElement]]] = None
+    graph: Optional[List[CytoscapeElement]] = None
+    errors: Dict[str, str] = {}  # Domains that failed, with the reason
+
+
+class GraphInvalidation(BaseModel):
+    domain: str
+    # False when no earlier build was cached; the next /graph crawls in full
+    incremental: bool
+    dids: List[str] = []  # DIDs whose call flows were rebuilt
+    api_calls: int = 0
+
+
 # --- NetSapiens API Models ---
 
 
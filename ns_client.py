@@ -1,12 +1,18 @@
+import asyncio
 import json
 import logging
+import random
+import time
 import urllib.parse
-from typing import Any, Dict, List, Optional, Type, TypeVar
+from email.utils import parsedate_to_datetime
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar, Union
 
 import httpx
 from fastapi import HTTPException
 from pydantic import BaseModel
 
+from cluster_health import ClusterHealth
 from models import (
     NSAnswerRule,
     NSAutoAttendantResponse,
@@ -15,52 +21,255 @@ from models import (
     NSTimeframe,
     NSUser,
 )
+from rate_limit import HostLimiters
+from response_cache import ResponseCache, token_identity
 
 T = TypeVar("T", bound=BaseModel)
 
 logger = logging.getLogger(__name__)
 
 
+def normalize_api_url(api_url: str) -> str:
+    """Turns a host or partial URL into the full ns-api v2 base URL."""
+    clean_url = api_url.strip().rstrip("/")
+    if not clean_url.startswith("http"):
+        clean_url = f"https://{clean_url}"
+
+    if not clean_url.endswith("/ns-api/v2"):
+        clean_url += "/ns-api/v2"
+
+    return clean_url
+
+
+def create_http_client(
+    timeout: float = 10.0,
+    limits: Optional[httpx.Limits] = None,
+    http2: bool = False,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> httpx.AsyncClient:
+    """
+    Builds an AsyncClient for NetSapiens calls. With http2, concurrent
+    requests to a host multiplex over one connection when the server
+    negotiates h2 via ALPN; servers that don't get HTTP/1.1 transparently.
+
+    The client never stores cookies: pooled clients serve every tenant and
+    token, so a session cookie set for one must not be sent for another.
+    """
+    if http2:
+        try:
+            import h2  # type: ignore # noqa: F401
+        except ImportError:
+            logger.warning(
+                "HTTP/2 requested but the 'h2' package is not installed. Using HTTP/1.1."
+            )
+            http2 = False
+
+    kwargs: Dict[str, Any] = {"limits": limits} if limits else {}
+    if transport is not None:
+        kwargs["transport"] = transport
+    return httpx.AsyncClient(
+        timeout=timeout,
+        http2=http2,
+        verify=False,
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        **kwargs,
+    )
+
+
+class _Retryable(Exception):
+    """A transient upstream failure; error is raised once retries run out."""
+
+    def __init__(
+        self, error: HTTPException, reason: str, retry_after: Optional[float] = None
+    ):
+        super().__init__(reason)
+        self.error = error
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Parses a Retry-After header given in seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _validators(response: httpx.Response) -> Optional[Dict[str, str]]:
+    """Conditional request headers that revalidate this response, if any."""
+    validators = {}
+    if response.headers.get("ETag"):
+        validators["If-None-Match"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        validators["If-Modified-Since"] = response.headers["Last-Modified"]
+    return validators or None
+
+
 class NSClient:
     def __init__(
         self,
         token: str,
         api_url: Optional[str] = None,
         client: Optional[httpx.AsyncClient] = None,
+        http2: bool = False,
+        cache: Optional[ResponseCache] = None,
+        refresh_cache: bool = False,
+        page_concurrency: int = 1,
+        retries: int = 0,
+        retry_backoff: float = 0.5,
+        retry_max_delay: float = 10.0,
+        retry_budget: int = 50,
+        limiters: Optional[HostLimiters] = None,
+        fallback_urls: Optional[List[str]] = None,
+        health: Optional[ClusterHealth] = None,
     ):
         self.token = token
         self.client = client
+        self.http2 = http2
+        # Shared cross-request response cache; None disables caching
+        self.cache = cache
+        # Skip cache reads (but still store fresh responses) for forced rebuilds
+        self.refresh_cache = refresh_cache
+        # Pages of a paginated listing fetched at once. 1 fetches them in turn.
+        self.page_concurrency = max(1, page_concurrency)
+        # Retries per request after 5xx, 429 or network errors, waiting
+        # retry_backoff * 2^n seconds with full jitter (or Retry-After).
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        # A longer Retry-After than this fails the request instead
+        self.retry_max_delay = retry_max_delay
+        # Retries left for this client (one build), so a struggling
+        # upstream isn't hit with retries * calls extra requests
+        self.retry_budget = retry_budget
+        # Process-wide per-host rate limits; None sends requests immediately
+        self.limiters = limiters
+        # Process-wide circuit breakers and latencies per base URL; None
+        # tries candidate_urls in their configured order every time
+        self.health = health
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
         }
         self.candidate_urls = []
         if api_url:
-            clean_url = api_url.strip().rstrip("/")
-            if not clean_url.startswith("http"):
-                clean_url = f"https://{clean_url}"
-
-            if not clean_url.endswith("/ns-api/v2"):
-                clean_url += "/ns-api/v2"
-
-            self.candidate_urls.append(clean_url)
+            self.candidate_urls.append(normalize_api_url(api_url))
+            # Other nodes of the same cluster, tried when the primary fails
+            for fallback_url in fallback_urls or []:
+                fallback_url = normalize_api_url(fallback_url)
+                if fallback_url not in self.candidate_urls:
+                    self.candidate_urls.append(fallback_url)
 
         if not self.candidate_urls:
             logger.warning("No API URL provided to NSClient.")
 
         self.call_stats: Dict[str, int] = {}
         self.total_calls = 0
+        # Requests answered by joining an identical in-flight request
+        self.coalesced_calls = 0
+        # Responses per negotiated protocol, e.g. {"HTTP/2": 310}
+        self.http_versions: Dict[str, int] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Expired cache entries confirmed unchanged by a 304
+        self.revalidated_calls = 0
+        self.retried_calls = 0
+        self.retry_wait = 0.0  # Seconds spent backing off
+        self.queue_wait = 0.0  # Seconds spent waiting on the rate limiter
+
+        # Cached responses are only shared between clients of the same API
+        # and token, so one portal user never sees another's data.
+        self._cache_scope = (
+            self.candidate_urls[0] if self.candidate_urls else None,
+            token_identity(token),
+        )
+
+        self._inflight: Dict[Tuple[Any, ...], "asyncio.Future[Any]"] = {}
 
     def log_stats(self):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("--- API Call Statistics ---")
             logger.debug(f"Total Calls: {self.total_calls}")
+            logger.debug(f"Coalesced Calls: {self.coalesced_calls}")
+            logger.debug(f"HTTP Versions: {self.http_versions}")
+            logger.debug(
+                f"Response Cache: {self.cache_hits} hits, {self.cache_misses} misses, "
+                f"{self.revalidated_calls} revalidated (304)"
+            )
+            logger.debug(f"Rate Limiter Wait: {self.queue_wait:.2f}s")
+            logger.debug(
+                f"Retries: {self.retried_calls} ({self.retry_wait:.2f}s backing off, "
+                f"{self.retry_budget} left in budget)"
+            )
             for endpoint, count in self.call_stats.items():
                 logger.debug(f"  {endpoint}: {count}")
             logger.debug("---------------------------")
 
+    def _flight_key(
+        self, method: str, path: str, model: Optional[Type[T]], kwargs: Dict[str, Any]
+    ) -> Optional[Tuple[Any, ...]]:
+        """Identifies a request that can share a response, or None if it cannot."""
+        if method != "GET" or set(kwargs) - {"params"}:
+            return None
+        params = kwargs.get("params") or {}
+        return (
+            method,
+            path,
+            model.__name__ if model else None,
+            tuple(sorted((k, str(v)) for k, v in params.items())),
+        )
+
     async def _request(
         self, method: str, path: str, model: Optional[Type[T]] = None, **kwargs
+    ) -> Any:
+        """
+        Serves GETs from the response cache when possible. Otherwise
+        concurrent identical GETs share one upstream call (single flight)
+        and all receive its result (or its exception).
+        """
+        key = self._flight_key(method, path, model, kwargs)
+        if key is None:
+            return await self._send(method, path, model, **kwargs)
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_scope + key
+            if not self.refresh_cache:
+                found, value = self.cache.get(cache_key)
+                if found:
+                    self.cache_hits += 1
+                    return value
+                self.cache_misses += 1
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced_calls += 1
+            logger.debug(f"Coalescing {method} {path} with in-flight request")
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(
+            self._send(method, path, model, cache_key=cache_key, **kwargs)
+        )
+        self._inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        model: Optional[Type[T]] = None,
+        cache_key: Optional[Tuple[Any, ...]] = None,
+        **kwargs,
     ) -> Any:
         import re
 
@@ -69,23 +278,108 @@ class NSClient:
         self.call_stats[stat_path] = self.call_stats.get(stat_path, 0) + 1
         self.total_calls += 1
 
-        exceptions = []
+        attempt = 0
+        while True:
+            try:
+                return await self._send_once(method, path, model, cache_key, **kwargs)
+            except _Retryable as e:
+                delay = self._retry_delay(attempt, e.retry_after)
+                if delay is None:
+                    raise e.error
+                attempt += 1
+                self.retried_calls += 1
+                self.retry_wait += delay
+                logger.warning(
+                    f"Retrying {method} {path} in {delay:.2f}s after {e.reason} "
+                    f"(retry {attempt} of {self.retries})"
+                )
+                await asyncio.sleep(delay)
+
+    def _retry_delay(
+        self, attempt: int, retry_after: Optional[float]
+    ) -> Optional[float]:
+        """Seconds to wait before retrying, or None to give up."""
+        if attempt >= self.retries:
+            return None
+        if retry_after is not None and retry_after > self.retry_max_delay:
+            logger.warning(f"Not retrying: upstream asked for {retry_after:.0f}s.")
+            return None
+        if self.retry_budget <= 0:
+            logger.warning("Not retrying: retry budget for this build is used up.")
+            return None
+
+        self.retry_budget -= 1
+        backoff = random.uniform(
+            0, min(self.retry_max_delay, self.retry_backoff * 2**attempt)
+        )
+        return max(backoff, retry_after or 0.0)
+
+    async def _send_once(
+        self,
+        method: str,
+        path: str,
+        model: Optional[Type[T]],
+        cache_key: Optional[Tuple[Any, ...]],
+        **kwargs,
+    ) -> Any:
+        """One pass over the candidate URLs. Raises _Retryable on transient failures."""
+        exceptions: List[Union[str, Exception]] = []
+        retry_after = None
+        # Validators of an expired cached copy, sent to get a 304 if unchanged
+        conditional = None
+        if cache_key is not None and self.cache is not None:
+            conditional = self.cache.validators(cache_key)
+
+        base_urls = self.candidate_urls
+        # With a single URL there is nothing to fail over to, so the breaker
+        # only reorders clusters; skipping the one URL would fail every call
+        if self.health is not None and len(self.candidate_urls) > 1:
+            base_urls = self.health.order(self.candidate_urls)
+            if not base_urls:
+                logger.error(f"Circuits open for every API endpoint: {method} {path}")
+                # Retryable, so the backoff gives a circuit time to half-open
+                raise _Retryable(
+                    HTTPException(
+                        status_code=503,
+                        detail="Upstream PBX Unreachable (circuit open)",
+                    ),
+                    "all circuits open",
+                )
 
-        for base_url in self.candidate_urls:
+        for base_url in base_urls:
             url = f"{base_url}{path}"
             logger.debug(f"Attempting API call: {method} {url}")
 
             try:
-                # Use provided client or create a temporary one (fallback)
-                if self.client:
-                    response = await self.client.request(
-                        method, url, headers=self.headers, **kwargs
+                response, latency = await self._limited_request(
+                    base_url, method, url, headers=conditional, **kwargs
+                )
+                if (
+                    response.status_code == 304
+                    and conditional
+                    and self.cache is not None
+                ):
+                    found, value = self.cache.revalidated(
+                        cache_key, self.cache.ttl_for(path)
                     )
-                else:
-                    async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-                        response = await client.request(
-                            method, url, headers=self.headers, **kwargs
-                        )
+                    if found:
+                        logger.debug(f"Not modified (304), reusing cached {url}")
+                        self.revalidated_calls += 1
+                        if self.health is not None:
+                            self.health.record_success(base_url, latency)
+                        return value
+                    # Evicted while the request was out; fetch it in full
+                    response, latency = await self._limited_request(
+                        base_url, method, url, **kwargs
+                    )
+                if self.health is not None:
+                    if response.status_code < 500:
+                        self.health.record_success(base_url, latency)
+                    else:
+                        self.health.record_failure(base_url)
+                self.http_versions[response.http_version] = (
+                    self.http_versions.get(response.http_version, 0) + 1
+                )
 
                 if logger.isEnabledFor(logging.DEBUG):
                     try:
@@ -99,7 +393,19 @@ class NSClient:
                 if response.status_code < 500:
                     if response.status_code == 404:
                         logger.info(f"Resource not found (404) at {url}")
-                        return [] if model else None
+                        result: Any = [] if model else None
+                        self._cache_store(cache_key, path, result, response)
+                        return result
+
+                    if response.status_code == 429:
+                        logger.warning(f"Rate limited (429) by {url}")
+                        raise _Retryable(
+                            HTTPException(
+                                status_code=429, detail=f"API Error: {response.text}"
+                            ),
+                            "429",
+                            _retry_after(response),
+                        )
 
                     if response.status_code >= 400:
                         logger.error(
@@ -113,17 +419,24 @@ class NSClient:
                     try:
                         data = response.json()
                         if model and isinstance(data, list):
-                            return [model.model_validate(item) for item in data]
+                            result = [model.model_validate(item) for item in data]
                         elif model and isinstance(data, dict):
-                            return model.model_validate(data)
-                        return data
+                            result = model.model_validate(data)
+                        else:
+                            result = data
                     except Exception as e:
                         logger.error(f"Failed to parse response from {url}: {e}")
                         return None
 
+                    self._cache_store(cache_key, path, result, response)
+                    return result
+
                 logger.warning(
                     f"API failover triggered. {base_url} returned {response.status_code}"
                 )
+                exceptions.append(f"HTTP {response.status_code}")
+                if response.status_code == 503:
+                    retry_after = _retry_after(response)
 
             except (
                 httpx.ConnectError,
@@ -131,39 +444,112 @@ class NSClient:
                 httpx.NetworkError,
             ) as e:
                 logger.warning(f"API failover triggered. {base_url} unreachable: {e}")
+                if self.health is not None:
+                    self.health.record_failure(base_url)
                 exceptions.append(e)
                 continue
 
         logger.error(f"All API endpoints failed. Exceptions: {exceptions}")
-        raise HTTPException(status_code=503, detail="Upstream PBX Unreachable")
+        error = HTTPException(status_code=503, detail="Upstream PBX Unreachable")
+        if not exceptions:
+            # No API URL configured; retrying won't change that
+            raise error
+        raise _Retryable(error, str(exceptions[-1]), retry_after)
+
+    async def _limited_request(
+        self,
+        base_url: str,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> Tuple[httpx.Response, float]:
+        """Sends one request; returns it with its latency, excluding queueing."""
+        if self.limiters is None:
+            return await self._timed_request(method, url, headers, **kwargs)
+        async with self.limiters.get(base_url).slot() as waited:
+            self.queue_wait += waited
+            return await self._timed_request(method, url, headers, **kwargs)
+
+    async def _timed_request(
+        self, method: str, url: str, headers: Optional[Dict[str, str]], **kwargs
+    ) -> Tuple[httpx.Response, float]:
+        if headers:
+            headers = {**self.headers, **headers}
+        start = time.monotonic()
+        if self.client:
+            response = await self.client.request(
+                method, url, headers=headers or self.headers, **kwargs
+            )
+        else:
+            # Without a shared client, one per request, closed straight after
+            async with create_http_client(http2=self.http2) as client:
+                response = await client.request(
+                    method, url, headers=headers or self.headers, **kwargs
+                )
+        return response, time.monotonic() - start
+
+    def _cache_store(
+        self,
+        cache_key: Optional[Tuple[Any, ...]],
+        path: str,
+        result: Any,
+        response: httpx.Response,
+    ):
+        if cache_key is not None and self.cache is not None:
+            self.cache.put(
+                cache_key,
+                result,
+                len(response.content),
+                self.cache.ttl_for(path),
+                validators=_validators(response),
+            )
 
     async def _get_paginated(
         self, path: str, model: Type[T], limit: int = 1000, max_items: int = 10000
     ) -> List[T]:
         items: List[T] = []
         start = 0
+        # The total isn't known up front, so once the first page comes back
+        # full the rest are requested page_concurrency at a time. The last
+        # wave may ask for a few pages past the end, which come back empty.
+        wave = 1
         while True:
-            batch = await self._request(
-                "GET", path, model=model, params={"limit": limit, "start": start}
+            starts = [
+                page_start
+                for page_start in range(start, start + wave * limit, limit)
+                # Past max_items the guard below has already tripped
+                if page_start <= max_items
+            ]
+            batches = await asyncio.gather(
+                *(
+                    self._request(
+                        "GET",
+                        path,
+                        model=model,
+                        params={"limit": limit, "start": page_start},
+                    )
+                    for page_start in starts
+                )
             )
 
-            if not batch:
-                break
+            for batch in batches:
+                if not batch:
+                    return items
 
-            items.extend(batch)
+                items.extend(batch)
 
-            if len(items) > max_items:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"Resource limit exceeded: >{max_items} items found at {path}",
-                )
-
-            if len(batch) < limit:
-                break
+                if len(items) > max_items:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Resource limit exceeded: >{max_items} items found at {path}",
+                    )
 
-            start += limit
+                if len(batch) < limit:
+                    return items
 
-        return items
+            start = starts[-1] + limit
+            wave = self.page_concurrency
 
     async def get_dids(self, domain: str) -> List[NSPhoneNumber]:
         return await self._get_paginated(
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class HostLimiter:
+    """
+    Token bucket (rate requests/second, bursts of up to burst) plus a cap on
+    requests in flight, for one upstream host. Callers over either limit
+    wait their turn rather than fail. rate or max_in_flight <= 0 disables
+    that limit.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0.0,
+        burst: int = 20,
+        max_in_flight: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.clock = clock
+
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        # Token waiters queue on the lock, so they are served in order
+        self._token_lock = asyncio.Lock()
+        self._in_flight = (
+            asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+        )
+
+        self.requests = 0
+        self.queued = 0  # Requests that had to wait
+        self.queue_delay = 0.0  # Total seconds spent waiting
+        self.max_queue_delay = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """Holds a request slot; yields the seconds spent waiting for it."""
+        start = self.clock()
+        if self._in_flight is not None:
+            await self._in_flight.acquire()
+        try:
+            await self._take_token()
+            waited = self.clock() - start
+            self._record(waited)
+            yield waited
+        finally:
+            if self._in_flight is not None:
+                self._in_flight.release()
+
+    async def _take_token(self):
+        if self.rate <= 0:
+            return
+        async with self._token_lock:
+            while True:
+                now = self.clock()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _record(self, waited: float):
+        self.requests += 1
+        if waited > 0.001:
+            self.queued += 1
+            self.queue_delay += waited
+            self.max_queue_delay = max(self.max_queue_delay, waited)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "queued": self.queued,
+            "queue_delay": round(self.queue_delay, 3),
+            "max_queue_delay": round(self.max_queue_delay, 3),
+        }
+
+
+class HostLimiters:
+    """
+    One HostLimiter per upstream host, shared by every NSClient in the
+    process so concurrent builds against one cluster share its limits.
+    overrides maps a hostname to its own {"rate", "burst", "max_in_flight"}.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0.0,
+        burst: int = 20,
+        max_in_flight: int = 0,
+        overrides: Optional[Dict[str, Dict[str, float]]] = None,
+    ):
+        self.defaults = {"rate": rate, "burst": burst, "max_in_flight": max_in_flight}
+        self.overrides = {
+            host.lower(): limits for host, limits in (overrides or {}).items()
+        }
+        self._limiters: Dict[str, HostLimiter] = {}
+
+    def get(self, url: str) -> HostLimiter:
+        host = (urlparse(url).hostname or "").lower()
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limits = {**self.defaults, **self.overrides.get(host, {})}
+            logger.info(f"Rate limiting {host or '<no host>'}: {limits}")
+            limiter = HostLimiter(
+                rate=float(limits["rate"]),
+                burst=int(limits["burst"]),
+                max_in_flight=int(limits["max_in_flight"]),
+            )
+            self._limiters[host] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {host: limiter.stats() for host, limiter in self._limiters.items()}
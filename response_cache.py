@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def token_identity(token: str) -> str:
+    """Short, non-reversible stand-in for a bearer token in cache keys."""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "validators")
+
+    def __init__(
+        self,
+        value: Any,
+        size: int,
+        expires_at: float,
+        validators: Optional[Dict[str, str]] = None,
+    ):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        # Conditional request headers, e.g. {"If-None-Match": '"abc"'}
+        self.validators = validators
+
+
+class ResponseCache:
+    """
+    Process-wide cache of parsed NetSapiens API responses shared by every
+    NSClient. Entries expire after a per-endpoint TTL, and once the stored
+    response bodies exceed max_bytes the least recently used are evicted.
+
+    Expired entries stored with validators (ETag / Last-Modified) are kept
+    until evicted, so the next request can revalidate them with a
+    conditional GET and reuse the parsed value on a 304.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        default_ttl: float = 30.0,
+        ttls: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # Keyed by endpoint name, e.g. {"answerrules": 30, "timeframes": 300}
+        self.ttls = ttls or {}
+        self.clock = clock
+
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+    def ttl_for(self, path: str) -> float:
+        """Returns the TTL for the innermost known resource in an API path."""
+        for segment in reversed(path.strip("/").split("/")):
+            if segment in self.ttls:
+                return self.ttls[segment]
+        return self.default_ttl
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (found, value). Cached values may themselves be empty."""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= self.clock():
+            if entry is not None and not entry.validators:
+                self._remove(key)
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry.value
+
+    def validators(self, key: Hashable) -> Optional[Dict[str, str]]:
+        """Returns conditional request headers for key's entry, fresh or not."""
+        entry = self._entries.get(key)
+        return entry.validators if entry is not None else None
+
+    def revalidated(self, key: Hashable, ttl: float) -> Tuple[bool, Any]:
+        """Marks key's entry fresh again after a 304. Returns (found, value)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        entry.expires_at = self.clock() + ttl
+        self._entries.move_to_end(key)
+        self.revalidations += 1
+        return True, entry.value
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        size: int,
+        ttl: float,
+        validators: Optional[Dict[str, str]] = None,
+    ):
+        """Stores value. size is the raw response size in bytes, used for the cap."""
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(value, size, self.clock() + ttl, validators)
+        self.total_bytes += size
+
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+        }
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
@@ -19,7 +19,7 @@
     }
 
     // 2. DATA FETCHER
-    function loadGraphData() {
+    function loadGraphData(forceRefresh) {
         var token = localStorage.getItem("ns_t");
         
         // Strict variable checks
@@ -42,28 +42,209 @@
             '<div style="width:100%; height:100%; display:flex; align-items:center; justify-content:center; flex-direction:column; color:#666;">' +
             '<i class="fa fa-spinner fa-spin fa-3x fa-fw"></i>' +
             '<span style="margin-top:15px; font-size:16px; font-weight:bold;">Building Call Flow Graph...</span>' +
-            '<span style="margin-top:5px; font-size:12px;">This may take a few seconds.</span>' +
             '</div>'
         );
 
+        var buildId = newBuildId();
+        watchProgress(buildId);
+
+        var params = { domain: domain , token: token , api_url: apiUrl, refresh: forceRefresh ? true : false, build_id: buildId };
+
+        if (window.fetch && window.ReadableStream && window.TextDecoder) {
+            streamGraphData(params);
+            return;
+        }
+
         $.ajax({
             url: apiEndpoint,
             method: 'GET',
-            data: { domain: domain , token: token , api_url: apiUrl},
+            data: params,
             success: function(data) {
+                stopProgress();
                 $('#cy_container').empty(); // Clear loader
                 renderCytoscape(data);
                 populateDidFilter(data);
             },
             error: function(err) {
+                stopProgress();
                 var msg = (err.responseJSON && err.responseJSON.detail) ? err.responseJSON.detail : err.statusText;
-                $('#cy_container').html('<div class="alert alert-danger" style="margin:20px;">API Error: ' + msg + '</div>');
+                showApiError(msg);
                 console.error("Route Graph API Error:", err);
             }
         });
     }
 
+    // BUILD PROGRESS (server-sent events from /graph/progress/{build_id})
+    var progressSource = null;
+
+    function newBuildId() {
+        if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+        return Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+
+    function watchProgress(buildId) {
+        stopProgress();
+        if (!window.EventSource) return;
+
+        $('#graph_progress_bar').css('width', '0%');
+        $('#graph_progress_text').text('Loading domain data...');
+        $('#graph_progress').show();
+
+        progressSource = new EventSource(apiEndpoint.replace(/\/+$/, '') + '/progress/' + encodeURIComponent(buildId));
+        progressSource.onmessage = function(evt) {
+            var p = JSON.parse(evt.data);
+            if (p.state === 'done' || p.state === 'failed' || p.state === 'unknown') {
+                stopProgress();
+                return;
+            }
+            showProgress(p);
+        };
+        // EventSource reconnects forever on its own; progress isn't worth that
+        progressSource.onerror = stopProgress;
+    }
+
+    function showProgress(p) {
+        if (p.dids_total === null || p.dids_total === undefined) {
+            $('#graph_progress_text').text('Loading domain data...');
+            return;
+        }
+        var percent = p.dids_total ? Math.round(100 * p.dids_done / p.dids_total) : 100;
+        $('#graph_progress_bar').css('width', percent + '%');
+        $('#graph_progress_text').text(
+            'Phone numbers: ' + p.dids_done + ' / ' + p.dids_total +
+            ' \u00b7 API calls: ' + p.api_calls + ' (' + p.cache_hits + ' cached)' +
+            ' \u00b7 Depth: ' + p.depth
+        );
+    }
+
+    function stopProgress() {
+        if (progressSource) {
+            progressSource.close();
+            progressSource = null;
+        }
+        $('#graph_progress').hide();
+    }
+
+    function showApiError(msg) {
+        $('#cy_container').html('<div class="alert alert-danger" style="margin:20px;">API Error: ' + msg + '</div>');
+    }
+
+    // Reads the NDJSON stream and draws the graph as the crawl discovers it.
+    // Edges wait for both endpoints and nodes for their compound parent.
+    function streamGraphData(params) {
+        var url = apiEndpoint.replace(/\/+$/, '') + '/stream?' + $.param(params);
+        var received = [];
+        var pending = [];
+        var known = {};
+        var lastFlush = 0;
+
+        function isEdge(el) {
+            return el.data.source !== undefined;
+        }
+
+        function isReady(el) {
+            if (isEdge(el)) return known[el.data.source] && known[el.data.target];
+            return !el.data.parent || known[el.data.parent];
+        }
+
+        function flush(final) {
+            var toAdd = [];
+            var progress = true;
+            while (progress) {
+                progress = false;
+                pending = pending.filter(function(el) {
+                    if (!isReady(el)) return true;
+                    if (!isEdge(el)) known[el.data.id] = true;
+                    toAdd.push(el);
+                    progress = true;
+                    return false;
+                });
+            }
+
+            if (final) {
+                // The crawl is over: place orphaned nodes at the top level,
+                // drop edges that still point nowhere.
+                pending.forEach(function(el) {
+                    if (isEdge(el)) {
+                        console.warn("Route Graph: dropping dangling edge", el.data.id);
+                    } else {
+                        el.data.parent = null;
+                        toAdd.push(el);
+                    }
+                });
+                pending = [];
+            }
+
+            lastFlush = Date.now();
+            if (!window.cy || !window.cy.streaming) {
+                $('#cy_container').empty(); // Clear loader
+                renderCytoscape(toAdd);
+                window.cy.streaming = true;
+            } else if (toAdd.length > 0) {
+                window.cy.add(toAdd);
+                window.cy.layout(graphLayout).run();
+            }
+        }
+
+        function handleLine(line) {
+            if (!line.trim()) return;
+            var el = JSON.parse(line);
+            if (el.error) throw new Error(el.error);
+            received.push(el);
+            pending.push(el);
+        }
+
+        window.cy = null;
+
+        fetch(url).then(function(response) {
+            if (!response.ok) {
+                return response.json().then(
+                    function(body) { throw new Error(body.detail || response.statusText); },
+                    function() { throw new Error(response.statusText); }
+                );
+            }
+
+            var reader = response.body.getReader();
+            var decoder = new TextDecoder();
+            var buffered = '';
+
+            function pump() {
+                return reader.read().then(function(chunk) {
+                    if (chunk.done) {
+                        stopProgress();
+                        handleLine(buffered);
+                        flush(true);
+                        window.cy.streaming = false;
+                        populateDidFilter(received);
+                        return;
+                    }
+                    buffered += decoder.decode(chunk.value, { stream: true });
+                    var lines = buffered.split('\n');
+                    buffered = lines.pop();
+                    lines.forEach(handleLine);
+                    // Redraw at most twice a second; layouts aren't free
+                    if (Date.now() - lastFlush > 500) flush(false);
+                    return pump();
+                });
+            }
+            return pump();
+        }).catch(function(err) {
+            stopProgress();
+            showApiError(err.message);
+            console.error("Route Graph API Error:", err);
+        });
+    }
+
     // 3. RENDERER
+    var graphLayout = {
+        name: 'breadthfirst', 
+        directed: true,
+        padding: 50,
+        spacingFactor: 1.2,
+        avoidOverlap: true,
+        nodeDimensionsIncludeLabels: true
+    };
+
     function renderCytoscape(graphData) {
         var container = document.getElementById('cy_container');
         if (!container) return;
@@ -152,14 +333,7 @@
                     }
                 }
             ],
-            layout: {
-                name: 'breadthfirst', 
-                directed: true,
-                padding: 50,
-                spacingFactor: 1.2,
-                avoidOverlap: true,
-                nodeDimensionsIncludeLabels: true
-            }
+            layout: graphLayout
         });
 
         window.cy.on('tap', 'node', function(evt){
@@ -411,7 +585,14 @@
                         '<button id="btn_zoom_in" class="btn btn-sm btn-default" style="' + btnStyle + '"><i class="fa fa-plus"></i></button>' +
                         '<button id="btn_zoom_out" class="btn btn-sm btn-default" style="' + btnStyle + '"><i class="fa fa-minus"></i></button>' +
                         '<button id="btn_export_png" class="btn btn-sm btn-default" style="' + btnStyle + '"><i class="fa fa-file-image-o"></i> PNG</button>' +
-                        '<button id="btn_export_drawio" class="btn btn-sm btn-default"><i class="fa fa-download"></i> Export Draw.io</button>' +
+                        '<button id="btn_export_drawio" class="btn btn-sm btn-default" style="' + btnStyle + '"><i class="fa fa-download"></i> Export Draw.io</button>' +
+                        '<button id="btn_refresh" class="btn btn-sm btn-default" title="Rebuild from the PBX, skipping cached data"><i class="fa fa-refresh"></i> Refresh</button>' +
+                    '</div>' +
+                    '<div id="graph_progress" style="display: none; margin-bottom: 10px;">' +
+                        '<div style="height: 6px; background: #eee; border-radius: 3px; overflow: hidden;">' +
+                            '<div id="graph_progress_bar" style="width: 0%; height: 100%; background: #00d1b2; transition: width 0.3s;"></div>' +
+                        '</div>' +
+                        '<div id="graph_progress_text" style="font-size: 12px; color: #666; margin-top: 3px;"></div>' +
                     '</div>' +
                     '<div id="cy_container" style="width: 100%; height: 600px; border: 1px solid #ddd; background: #f9f9f9;"></div>' +
                     tooltipHtml +
@@ -737,6 +918,10 @@
                 }
             });
 
+            $('#btn_refresh').on('click', function() {
+                ensureCytoscapeLoaded(function() { loadGraphData(true); });
+            });
+
             $('#btn_fit').on('click', function() {
                 if(window.cy) window.cy.fit(30);
             });
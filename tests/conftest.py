@@ -0,0 +1,162 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from models import NSAnswerRule, NSForwardingLogic, NSPhoneNumber, NSUser
+from ns_client import NSClient
+
+
+class FakeClock:
+    """Stands in for time.monotonic; tests move time by setting now."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def mock_api_client():
+    """
+    Returns a factory for NSClients whose requests are answered by handler
+    through httpx.MockTransport. Keyword arguments go to NSClient.
+    """
+
+    def make(
+        handler, token: str = "token", api_url: str = "pbx.example.com", **kwargs
+    ) -> NSClient:
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return NSClient(token, api_url, client=http_client, **kwargs)
+
+    return make
+
+
+# API methods GraphBuilder calls, and what they return unless a test says
+_NS_METHODS: Dict[str, Any] = {
+    "get_users": [],
+    "get_domain_timeframes": [],
+    "get_dids": [],
+    "get_answer_rules": [],
+    "get_auto_attendant_prompts": None,
+    "get_call_queue_agents": [],
+}
+
+
+@pytest.fixture
+def mock_ns_client():
+    """
+    Returns a factory for MagicMock NSClients whose API methods are
+    AsyncMocks. Each keyword names a method: a callable becomes its
+    side_effect, anything else its return value.
+    """
+
+    def make(**methods) -> MagicMock:
+        client = MagicMock(spec=NSClient)
+        for name, default in _NS_METHODS.items():
+            value = methods.pop(name, default)
+            if callable(value):
+                setattr(client, name, AsyncMock(side_effect=value))
+            else:
+                setattr(client, name, AsyncMock(return_value=value))
+        if methods:
+            raise TypeError(f"Not an NSClient API method: {', '.join(methods)}")
+        return client
+
+    return make
+
+
+def _forward(user: str, target: str, when: str = "forward_always") -> NSAnswerRule:
+    return NSAnswerRule(
+        domain="test.com",
+        user=user,
+        time_frame="*",
+        **{when: NSForwardingLogic(enabled="yes", parameters=[target])},
+    )
+
+
+@pytest.fixture
+def fan_in_client(mock_ns_client):
+    """
+    Returns a factory for (client, state): 20 DIDs land on users 101 and 102,
+    which both forward into user 100. Answer rules take 10ms each; state
+    tracks how many were fetched at once.
+    """
+
+    def make():
+        rules = {
+            "101": [_forward("101", "100")],
+            "102": [_forward("102", "100", when="forward_no_answer")],
+            "100": [_forward("100", "vmail_100")],
+        }
+        state = {"active": 0, "peak": 0}
+
+        async def get_answer_rules(domain, user):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            return rules.get(user, [])
+
+        client = mock_ns_client(
+            get_users=[
+                NSUser(user=u, domain="test.com") for u in ("100", "101", "102")
+            ],
+            get_dids=[
+                NSPhoneNumber(
+                    phonenumber=f"555000{i:04d}",
+                    domain="test.com",
+                    dest="101" if i % 2 else "102",
+                )
+                for i in range(20)
+            ],
+            get_answer_rules=get_answer_rules,
+        )
+        return client, state
+
+    return make
+
+
+@pytest.fixture
+def world_client(mock_ns_client):
+    """
+    Returns a factory for MagicMock NSClients serving a world dict: "dids"
+    and "users" lists, plus "rules", "aa" and "queues" keyed by user,
+    owner:prompt and queue. Later edits to the world are served too. Each
+    per-resource call is appended to calls as (kind, key).
+    """
+
+    def make(world, calls: Optional[List[Tuple[str, str]]] = None) -> MagicMock:
+        log = [] if calls is None else calls
+
+        async def get_answer_rules(domain, user):
+            log.append(("rules", user))
+            return world["rules"].get(user, [])
+
+        async def get_auto_attendant_prompts(domain, owner, prompt):
+            log.append(("aa", f"{owner}:{prompt}"))
+            return world["aa"].get(f"{owner}:{prompt}")
+
+        async def get_call_queue_agents(domain, queue):
+            log.append(("queue", queue))
+            return world["queues"].get(queue, [])
+
+        client = mock_ns_client(
+            get_users=lambda domain: list(world["users"]),
+            get_dids=lambda domain: list(world["dids"]),
+            get_answer_rules=get_answer_rules,
+            get_auto_attendant_prompts=get_auto_attendant_prompts,
+            get_call_queue_agents=get_call_queue_agents,
+        )
+        client.total_calls = 0
+        return client
+
+    return make
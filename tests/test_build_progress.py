@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+from build_progress import ProgressTracker
+from graph_builder import GraphBuilder
+
+
+@pytest.mark.asyncio
+async def test_builder_counts_dids_and_depth(fan_in_client):
+    builder = GraphBuilder(fan_in_client()[0], "test.com", max_concurrency=8)
+    assert builder.progress()["dids_total"] is None
+
+    await builder.build()
+
+    counters = builder.progress()
+    assert counters["dids_done"] == counters["dids_total"] == 20
+    # DID -> 101/102 -> 100 -> voicemail
+    assert counters["depth"] == 3
+    # MagicMock clients have no call counters
+    assert counters["api_calls"] == 0
+
+
+@pytest.mark.asyncio
+async def test_watch_follows_a_build_registered_after_it_connects(fan_in_client):
+    tracker = ProgressTracker()
+    builder = GraphBuilder(fan_in_client()[0], "test.com")
+
+    async def run_build():
+        await asyncio.sleep(0.02)
+        tracker.start("b1")
+        tracker.attach("b1", builder)
+        await builder.build()
+        tracker.finish("b1")
+
+    snapshots = []
+
+    async def watch():
+        async for snapshot in tracker.watch("b1", interval=0.005):
+            snapshots.append(snapshot)
+
+    await asyncio.gather(run_build(), watch())
+
+    assert snapshots[0]["state"] == "running"
+    assert snapshots[-1]["state"] == "done"
+    assert snapshots[-1]["dids_done"] == 20
+
+
+@pytest.mark.asyncio
+async def test_watch_gives_up_on_unknown_builds():
+    tracker = ProgressTracker()
+    snapshots = [s async for s in tracker.watch("nope", interval=0.001, wait=0.01)]
+    assert snapshots == [{"build_id": "nope", "state": "unknown"}]
+
+
+def test_finished_builds_expire():
+    now = [0.0]
+    tracker = ProgressTracker(retention=60, clock=lambda: now[0])
+    tracker.start("old")
+    tracker.finish("old", error="boom")
+    assert tracker.snapshot("old") == {
+        "build_id": "old",
+        "state": "failed",
+        "error": "boom",
+    }
+
+    now[0] += 61
+    tracker.start("new")
+    assert tracker.snapshot("old") is None
+
+
+@pytest.mark.asyncio
+async def test_progress_endpoint_sends_server_sent_events(monkeypatch, fan_in_client):
+    monkeypatch.setattr(main, "graph_cache", None)
+    monkeypatch.setattr(main, "progress", ProgressTracker())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(fan_in_client()[0], "test.com"),
+    )
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        graph = await http.get(
+            "/graph", params={"domain": "test.com", "token": "t", "build_id": "b1"}
+        )
+        events = await http.get("/graph/progress/b1")
+
+    assert graph.status_code == 200
+    assert events.headers["content-type"].startswith("text/event-stream")
+    data = [
+        json.loads(line[len("data: ") :])
+        for line in events.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert data[-1]["state"] == "done"
+    assert data[-1]["dids_done"] == data[-1]["dids_total"] == 20
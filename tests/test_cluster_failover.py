@@ -0,0 +1,156 @@
+import asyncio
+from typing import Dict, List
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from cluster_health import CLOSED, HALF_OPEN, OPEN, ClusterHealth, cluster_urls
+from ns_client import NSClient
+
+RULE = {"domain": "test.com", "user": "101", "time-frame": "*"}
+PRIMARY = "https://api.example.com/ns-api/v2"
+BACKUP = "https://api2.example.com/ns-api/v2"
+
+
+@pytest.fixture
+def make_client(mock_api_client):
+    def make(down, hits, health) -> NSClient:
+        """Hosts in down refuse connections; the rest answer."""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            hits.append(request.url.host)
+            if request.url.host in down:
+                raise httpx.ConnectError("connection refused")
+            return httpx.Response(200, json=[RULE])
+
+        return mock_api_client(
+            handler,
+            api_url="api.example.com",
+            fallback_urls=["api2.example.com", "https://api.example.com"],
+            health=health,
+        )
+
+    return make
+
+
+def test_cluster_urls_are_looked_up_by_host():
+    clusters = {"API.example.com": ["https://api2.example.com"]}
+
+    assert cluster_urls("https://api.example.com/ns-api/v2", clusters) == [
+        "https://api2.example.com"
+    ]
+    assert cluster_urls("api.example.com", clusters) == ["https://api2.example.com"]
+    assert cluster_urls("other.example.com", clusters) == []
+    assert cluster_urls(None, clusters) == []
+
+
+@pytest.mark.asyncio
+async def test_dead_node_is_skipped_once_its_circuit_opens(make_client, clock):
+    hits: List[str] = []
+    health = ClusterHealth(failure_threshold=2, reset_timeout=30, clock=clock)
+    client = make_client({"api.example.com"}, hits, health)
+
+    assert client.candidate_urls == [PRIMARY, BACKUP]
+    for user in ("101", "102", "103", "104"):
+        await client.get_answer_rules("test.com", user)
+
+    # The primary is tried until it fails twice, then only the backup is called
+    assert hits.count("api.example.com") == 2
+    assert hits.count("api2.example.com") == 4
+    assert health.stats()[PRIMARY]["state"] == OPEN
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_or_reopens_the_circuit(make_client, clock):
+    hits: List[str] = []
+    health = ClusterHealth(failure_threshold=1, reset_timeout=30, clock=clock)
+    down = {"api.example.com"}
+    client = make_client(down, hits, health)
+
+    await client.get_answer_rules("test.com", "101")
+    assert health.stats()[PRIMARY]["state"] == OPEN
+
+    # Due for a probe: one caller gets it, others keep skipping the node
+    clock.now += 31
+    assert health.order([PRIMARY, BACKUP]) == [PRIMARY, BACKUP]
+    assert health.stats()[PRIMARY]["state"] == HALF_OPEN
+    assert health.order([PRIMARY, BACKUP]) == [BACKUP]
+
+    # A failed probe reopens it...
+    health.record_failure(PRIMARY)
+    assert health.stats()[PRIMARY]["state"] == OPEN
+    assert health.order([PRIMARY, BACKUP]) == [BACKUP]
+
+    # ...and a successful one closes it
+    clock.now += 31
+    down.clear()
+    hits.clear()
+    await client.get_answer_rules("test.com", "102")
+    assert hits == ["api.example.com"]
+    assert health.stats()[PRIMARY]["state"] == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_all_circuits_open_fails_fast(make_client, clock):
+    hits: List[str] = []
+    health = ClusterHealth(failure_threshold=1, clock=clock)
+    client = make_client({"api.example.com", "api2.example.com"}, hits, health)
+
+    with pytest.raises(HTTPException):
+        await client.get_answer_rules("test.com", "101")
+    assert len(hits) == 2
+
+    with pytest.raises(HTTPException) as exc:
+        await client.get_answer_rules("test.com", "102")
+    assert exc.value.status_code == 503
+    assert len(hits) == 2
+
+
+def test_healthy_nodes_are_ordered_by_latency():
+    health = ClusterHealth(latency_weight=0.5)
+    third = "https://api3.example.com/ns-api/v2"
+
+    # Unmeasured nodes keep the configured order
+    assert health.order([PRIMARY, BACKUP, third]) == [PRIMARY, BACKUP, third]
+
+    health.record_success(PRIMARY, 0.450)
+    health.record_success(BACKUP, 0.100)
+    health.record_success(third, 0.200)
+    assert health.order([PRIMARY, BACKUP, third]) == [BACKUP, third, PRIMARY]
+
+    # The average moves with new samples
+    health.record_success(BACKUP, 0.500)
+    health.record_success(BACKUP, 0.500)
+    assert health.order([PRIMARY, BACKUP, third]) == [third, BACKUP, PRIMARY]
+    assert health.stats()[BACKUP]["latency_ms"] == 400.0
+
+
+@pytest.mark.asyncio
+async def test_single_url_is_still_retried_after_its_circuit_opens(
+    mock_api_client, clock
+):
+    attempts: Dict[str, int] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        # Every call fails once, then succeeds
+        attempts[request.url.path] = attempts.get(request.url.path, 0) + 1
+        if attempts[request.url.path] == 1:
+            return httpx.Response(502)
+        return httpx.Response(200, json=[RULE])
+
+    health = ClusterHealth(failure_threshold=2, clock=clock)
+    client = mock_api_client(
+        handler,
+        api_url="api.example.com",
+        retries=2,
+        retry_backoff=0.001,
+        health=health,
+    )
+
+    results = await asyncio.gather(
+        *(client.get_answer_rules("test.com", user) for user in ("101", "102", "103"))
+    )
+
+    assert all(rules[0].user == "101" for rules in results)
+    assert client.retried_calls == 3
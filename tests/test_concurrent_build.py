@@ -0,0 +1,78 @@
+import asyncio
+from typing import List
+
+import pytest
+from fastapi import HTTPException
+
+from graph_builder import GraphBuilder
+from models import NSPhoneNumber
+
+
+def element_ids(elements):
+    return [
+        getattr(e.data, "id", None) or f"{e.data.source}_{e.data.target}"
+        for e in elements
+    ]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_build_matches_sequential_order(fan_in_client):
+    seq_client, _ = fan_in_client()
+    sequential = await GraphBuilder(seq_client, "test.com").build()
+
+    par_client, state = fan_in_client()
+    parallel = await GraphBuilder(par_client, "test.com", max_concurrency=8).build()
+
+    assert element_ids(parallel) == element_ids(sequential)
+    assert [e.model_dump() for e in parallel] == [e.model_dump() for e in sequential]
+    assert state["peak"] > 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_build_fetches_shared_resources_once(fan_in_client):
+    mock_client, _ = fan_in_client()
+    builder = GraphBuilder(mock_client, "test.com", max_concurrency=8)
+    await builder.build()
+
+    fetched_users = [
+        call.args[1] for call in mock_client.get_answer_rules.call_args_list
+    ]
+    assert sorted(fetched_users) == ["100", "101", "102"]
+    assert builder._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_walk_cancels_the_other_walks(mock_ns_client):
+    fetched: List[str] = []
+
+    async def get_users(domain):
+        await asyncio.sleep(10)
+        return []
+
+    async def get_answer_rules(domain, user):
+        fetched.append(user)
+        if user == "201":
+            raise HTTPException(status_code=503, detail="Service Unavailable")
+        await asyncio.sleep(0.01)
+        return []
+
+    mock_client = mock_ns_client(
+        get_users=get_users,
+        get_dids=[
+            NSPhoneNumber(
+                phonenumber=f"55500{i:02d}", domain="test.com", dest=f"user_2{i:02d}"
+            )
+            for i in range(20)
+        ],
+        get_answer_rules=get_answer_rules,
+    )
+    builder = GraphBuilder(mock_client, "test.com", max_concurrency=4)
+
+    with pytest.raises(HTTPException):
+        await builder.build()
+    calls = len(fetched)
+    await asyncio.sleep(0.05)
+
+    # No walk starts or carries on after the failure
+    assert len(fetched) == calls < 20
+    assert builder._global_data is not None and builder._global_data.cancelled()
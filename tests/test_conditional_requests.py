@@ -0,0 +1,126 @@
+from typing import List
+
+import httpx
+import pytest
+
+from models import NSAnswerRule
+from ns_client import NSClient
+from response_cache import ResponseCache
+
+RULE = {"domain": "test.com", "user": "101", "time-frame": "*"}
+
+
+@pytest.fixture
+def make_client(mock_api_client):
+    def make(
+        cache, requests, etag='"v1"', last_modified=None, refresh=False
+    ) -> NSClient:
+        """Answers 304 when the request's validators match the current version."""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            if etag and request.headers.get("If-None-Match") == etag:
+                return httpx.Response(304)
+            if (
+                last_modified
+                and request.headers.get("If-Modified-Since") == last_modified
+            ):
+                return httpx.Response(304)
+            headers = {}
+            if etag:
+                headers["ETag"] = etag
+            if last_modified:
+                headers["Last-Modified"] = last_modified
+            return httpx.Response(200, json=[RULE], headers=headers)
+
+        return mock_api_client(handler, cache=cache, refresh_cache=refresh)
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_revalidated_and_reused(make_client, clock):
+    cache = ResponseCache(default_ttl=30, clock=clock)
+    requests: List[httpx.Request] = []
+
+    first = await make_client(cache, requests).get_answer_rules("test.com", "101")
+    clock.now += 31
+    client = make_client(cache, requests)
+    second = await client.get_answer_rules("test.com", "101")
+
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+    assert requests[1].headers["Authorization"] == "Bearer token"
+    # The parsed models are reused as-is, and are fresh for another TTL
+    assert second is first
+    assert isinstance(second[0], NSAnswerRule)
+    assert client.revalidated_calls == 1
+    await client.get_answer_rules("test.com", "101")
+    assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_last_modified_is_used_without_an_etag(make_client, clock):
+    cache = ResponseCache(default_ttl=30, clock=clock)
+    requests: List[httpx.Request] = []
+    stamp = "Wed, 21 Oct 2026 07:28:00 GMT"
+
+    for _ in range(2):
+        client = make_client(cache, requests, etag=None, last_modified=stamp)
+        await client.get_answer_rules("test.com", "101")
+        clock.now += 31
+
+    assert requests[-1].headers["If-Modified-Since"] == stamp
+    assert cache.revalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_changed_resource_is_replaced(make_client, clock):
+    cache = ResponseCache(default_ttl=30, clock=clock)
+    requests: List[httpx.Request] = []
+
+    first = await make_client(cache, requests).get_answer_rules("test.com", "101")
+    clock.now += 31
+    client = make_client(cache, requests, etag='"v2"')
+    second = await client.get_answer_rules("test.com", "101")
+    clock.now += 31
+    await make_client(cache, requests, etag='"v2"').get_answer_rules("test.com", "101")
+
+    assert second is not first
+    assert client.revalidated_calls == 0
+    assert requests[2].headers["If-None-Match"] == '"v2"'
+
+
+@pytest.mark.asyncio
+async def test_responses_without_validators_expire_as_before(make_client, clock):
+    cache = ResponseCache(default_ttl=30, clock=clock)
+    requests: List[httpx.Request] = []
+
+    await make_client(cache, requests, etag=None).get_answer_rules("test.com", "101")
+    clock.now += 31
+    await make_client(cache, requests, etag=None).get_answer_rules("test.com", "101")
+
+    assert "If-None-Match" not in requests[1].headers
+    assert "If-Modified-Since" not in requests[1].headers
+    assert cache.stats()["entries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_forced_refresh_revalidates_fresh_entries(make_client):
+    cache = ResponseCache(default_ttl=30)
+    requests: List[httpx.Request] = []
+
+    first = await make_client(cache, requests).get_answer_rules("test.com", "101")
+    client = make_client(cache, requests, refresh=True)
+    second = await client.get_answer_rules("test.com", "101")
+
+    # refresh skips the cache read but still only costs a 304
+    assert len(requests) == 2
+    assert second is first
+    assert client.revalidated_calls == 1
+
+
+def test_evicted_entry_cannot_be_revalidated():
+    cache = ResponseCache()
+    assert cache.validators("k") is None
+    assert cache.revalidated("k", ttl=30) == (False, None)
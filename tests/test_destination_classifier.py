@@ -0,0 +1,106 @@
+import re
+import time
+from unittest.mock import MagicMock
+
+from graph_builder import GraphBuilder
+from models import NSUser
+from ns_client import NSClient
+
+DOMAIN = "test.com"
+
+# Destinations as they appear in DIDs, answer rules and AA options
+CORPUS = [
+    "101",
+    "5551234567",
+    "15551234567",
+    "555",
+    "user_101",
+    f"user_102@{DOMAIN}",
+    "vmail_101",
+    "queue_200",
+    "phone_101a",
+    "Prompt_1001",
+    "Announce_300",
+    "5550001000_callqueue_200",
+    "5550001000_attendant_101",
+    "5550001000_pstn_5559876543",
+    "hangup",
+    "Hangup",
+    "conf_room",
+    "",
+    "sip:101@test.com",
+]
+
+
+def legacy_get_type_and_name(builder, target):
+    """_get_type_and_name before the classifier was precompiled."""
+    target = str(target)
+    m_queue = re.match(r"^\d+_callqueue_(\w+)$", target)
+    if m_queue:
+        return "call_queue", m_queue.group(1), f"user_{m_queue.group(1)}"
+    m_att = re.match(r"^\d+_attendant_(\w+)$", target)
+    if m_att:
+        return "user", m_att.group(1), None
+    m_pstn = re.match(r"^\d+_pstn_(\d+)$", target)
+    if m_pstn:
+        return "offnet", m_pstn.group(1), None
+    if "Prompt" in target or "Announce" in target:
+        return "auto_attendant", target, None
+    if "vmail_" in target:
+        return "voicemail", target, None
+    if "queue_" in target:
+        return "call_queue", target.replace("queue_", ""), None
+    if "user_" in target:
+        u_name = target.replace("user_", "")
+        if u_name.endswith(f"@{builder.domain}"):
+            u_name = u_name.split("@")[0]
+        return "user", u_name, None
+    if "phone_" in target:
+        return "device", target.replace("phone_", ""), None
+    if target in builder.users_map:
+        return "user", target, None
+    if re.match(r"^1?\d{10}$", target):
+        return "offnet", target, None
+    if target.lower() == "hangup":
+        return "hangup", "Hangup", None
+    return "other", target, None
+
+
+def make_builder():
+    builder = GraphBuilder(MagicMock(spec=NSClient), DOMAIN)
+    builder.users_map = {"101": NSUser(user="101", domain=DOMAIN)}
+    return builder
+
+
+def test_classifier_matches_previous_rules():
+    builder = make_builder()
+    for target in CORPUS + [101, 5551234567]:
+        assert builder._get_type_and_name(target) == legacy_get_type_and_name(
+            builder, target
+        ), target
+
+
+def test_classifier_benchmark():
+    # A large build classifies the same few hundred destinations many times
+    corpus = [f"{t}{i}" if t.isdigit() else t for t in CORPUS for i in range(20)]
+    rounds = 50
+
+    legacy_builder = make_builder()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for target in corpus:
+            legacy_get_type_and_name(legacy_builder, target)
+    legacy_time = time.perf_counter() - start
+
+    builder = make_builder()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for target in corpus:
+            builder._get_type_and_name(target)
+    new_time = time.perf_counter() - start
+
+    print(
+        f"\n{rounds * len(corpus)} classifications: "
+        f"legacy {legacy_time:.3f}s, precompiled + memo {new_time:.3f}s"
+    )
+    assert new_time * 2 < legacy_time
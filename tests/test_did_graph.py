@@ -0,0 +1,97 @@
+from typing import List, Tuple
+
+import httpx
+import pytest
+from test_incremental_rebuild import as_set, make_world
+
+import main
+from graph_builder import GraphBuilder
+from graph_cache import GraphCache
+
+
+async def get(path, **params):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.get(
+            path, params={"domain": "test.com", "token": "t", **params}
+        )
+
+
+@pytest.mark.asyncio
+async def test_single_did_walks_only_its_call_flow(world_client):
+    world = make_world()
+    calls: List[Tuple[str, str]] = []
+    builder = GraphBuilder(world_client(world, calls), "test.com")
+
+    graph = await builder.build_did("555-0001")
+
+    assert graph is not None
+    ids = {e.data.id for e in graph}
+    assert "did_5550001" in ids and "user_101" in ids
+    assert "did_5550002" not in ids
+    assert sorted(calls) == [("rules", "100"), ("rules", "101")]
+
+
+@pytest.mark.asyncio
+async def test_unknown_did_returns_none(world_client):
+    builder = GraphBuilder(world_client(make_world()), "test.com")
+
+    assert await builder.build_did("5559999") is None
+
+
+@pytest.mark.asyncio
+async def test_subgraph_of_a_finished_build_matches_a_single_walk(world_client):
+    world = make_world()
+    full = GraphBuilder(world_client(world), "test.com")
+    await full.build()
+
+    single = GraphBuilder(world_client(world), "test.com")
+    assert as_set(await full.subgraph("555.0001")) == as_set(
+        await single.build_did("5550001")
+    )
+    assert await full.subgraph("5559999") is None
+
+    # Queue agents are linked, not walked, but keep the expansion another
+    # DID gave them in the domain graph
+    queue_flow = as_set(await full.subgraph("5550003"))
+    single = GraphBuilder(world_client(world), "test.com")
+    assert queue_flow > as_set(await single.build_did("5550003"))
+
+
+@pytest.mark.asyncio
+async def test_did_endpoints(monkeypatch, world_client):
+    world = make_world()
+    calls: List[Tuple[str, str]] = []
+    monkeypatch.setattr(main, "graph_cache", GraphCache())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(world_client(world, calls), "test.com"),
+    )
+    monkeypatch.setattr(
+        main, "create_client", lambda *args, **kwargs: world_client(world, calls)
+    )
+
+    response = await get("/graph/dids")
+    assert response.status_code == 200
+    assert response.json()[1] == {
+        "number": "5550002",
+        "label": "5550002",
+        "destination": "001:Prompt_1",
+        "application": None,
+    }
+
+    response = await get("/graph/did/5550001")
+    assert response.status_code == 200
+    assert {e["data"]["id"] for e in response.json()} >= {"did_5550001", "user_100"}
+    assert ("aa", "001:Prompt_1") not in calls
+
+    assert (await get("/graph/did/5559999")).status_code == 404
+
+    # With a fresh domain graph cached, the subgraph is cut from it
+    await main.get_or_build_graph("test.com", "t", None)
+    calls.clear()
+    response = await get("/graph/did/5550002")
+    assert response.status_code == 200
+    assert "did_5550002" in {e["data"]["id"] for e in response.json()}
+    assert calls == []
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Dict, Tuple
+from unittest.mock import MagicMock
+
+import pytest
+
+from graph_builder import GraphBuilder
+from models import EdgeData, NSAnswerRule, NSForwardingLogic, NSPhoneNumber, NSUser
+
+FANOUT = 20
+
+
+@pytest.fixture
+def make_client(mock_ns_client):
+    def make() -> Tuple[MagicMock, Dict[str, int]]:
+        users = ["100"] + [str(200 + i) for i in range(FANOUT)]
+        state: Dict[str, int] = {"active": 0, "peak": 0}
+
+        async def get_answer_rules(domain, user):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.02)
+            state["active"] -= 1
+
+            # 100 rings all 2xx users; each 2xx user forwards to their voicemail
+            if user == "100":
+                targets = users[1:]
+                logic = {
+                    "simultaneous_ring": NSForwardingLogic(
+                        enabled="yes", parameters=targets
+                    )
+                }
+            else:
+                logic = {
+                    "forward_always": NSForwardingLogic(
+                        enabled="yes", parameters=[f"vmail_{user}"]
+                    )
+                }
+            return [NSAnswerRule(domain=domain, user=user, time_frame="*", **logic)]
+
+        mock_client = mock_ns_client(
+            get_users=[NSUser(user=u, domain="test.com") for u in users],
+            get_dids=[
+                NSPhoneNumber(phonenumber="5550001000", domain="test.com", dest="100")
+            ],
+            get_answer_rules=get_answer_rules,
+        )
+        return mock_client, state
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_frontier_is_fetched_concurrently(make_client):
+    mock_client, state = make_client()
+    builder = GraphBuilder(mock_client, "test.com")
+
+    elements = await builder.build()
+
+    # All 20 users of the second level are fetched at once
+    assert state["peak"] == FANOUT
+    assert mock_client.get_answer_rules.call_count == FANOUT + 1
+
+    edges = [e.data for e in elements if isinstance(e.data, EdgeData)]
+    vmail_edges = [e for e in edges if e.target.startswith("voicemail_")]
+    assert len(vmail_edges) == FANOUT
+
+
+@pytest.mark.asyncio
+async def test_frontier_preserves_bfs_order(make_client):
+    mock_client, _ = make_client()
+    builder = GraphBuilder(mock_client, "test.com")
+
+    elements = await builder.build()
+    ids = [e.data.id or "" for e in elements]
+
+    # Level by level: DID, user 100, then each 2xx user (edge, node) in
+    # rule order, then their voicemail boxes in the same order.
+    user_ids = [i for i in ids if i.startswith("user_2")]
+    vmail_ids = [i for i in ids if i.startswith("voicemail_")]
+    assert user_ids == [f"user_{200 + i}" for i in range(FANOUT)]
+    assert vmail_ids == [f"voicemail_vmail_{200 + i}" for i in range(FANOUT)]
+    assert ids.index(user_ids[-1]) < ids.index(vmail_ids[0])
@@ -0,0 +1,115 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from test_incremental_rebuild import make_world
+
+import main
+from graph_builder import GraphBuilder, combine_graphs
+from graph_cache import GraphCache
+from models import EdgeData
+
+
+def patch_main(monkeypatch, world_client, world, state, fail=()):
+    """Every build shares the batch's client; fail lists domains whose DIDs 503."""
+    clients = []
+
+    def create_client(*args, **kwargs):
+        client = world_client(world)
+        client.retry_budget = 50
+
+        async def get_dids(domain):
+            if domain in fail:
+                raise HTTPException(status_code=503, detail="Upstream PBX Unreachable")
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            return list(world["dids"])
+
+        client.get_dids.side_effect = get_dids
+        clients.append(client)
+        return client
+
+    def create_builder(domain, token, api_url, refresh=False, client=None):
+        return GraphBuilder(client or create_client(), domain)
+
+    monkeypatch.setattr(main, "graph_cache", GraphCache())
+    monkeypatch.setattr(main, "create_client", create_client)
+    monkeypatch.setattr(main, "create_builder", create_builder)
+    return clients
+
+
+@pytest.mark.asyncio
+async def test_domains_share_one_client_under_the_cap(monkeypatch, world_client):
+    state = {"active": 0, "peak": 0}
+    clients = patch_main(
+        monkeypatch, world_client, make_world(), state, fail={"down.com"}
+    )
+    monkeypatch.setattr(main.settings, "GRAPH_BATCH_MAX_CONCURRENCY", 2)
+    domains = [f"d{i}.com" for i in range(6)] + ["down.com", "d0.com"]
+
+    graphs, errors = await main.build_graphs(domains, "t", None)
+
+    assert list(graphs) == [f"d{i}.com" for i in range(6)]
+    assert errors == {"down.com": "Upstream PBX Unreachable"}
+    assert len(clients) == 1
+    assert clients[0].retry_budget == 50 * 7
+    assert state["peak"] == 2
+
+
+def test_combined_graph_prefixes_ids_per_domain(world_client):
+    world = make_world()
+
+    async def build(domain):
+        return await GraphBuilder(world_client(world), domain).build()
+
+    graphs = {
+        "a.example.com": asyncio.run(build("a.example.com")),
+        "b.example.com": asyncio.run(build("b.example.com")),
+    }
+    combined = combine_graphs(graphs)
+
+    ids = [e.data.id for e in combined]
+    assert len(ids) == len(set(ids)) == sum(len(g) for g in graphs.values())
+    assert "a_example_com__did_5550001" in ids
+    assert "b_example_com__did_5550001" in ids
+    nodes = set(ids)
+    for element in combined:
+        if isinstance(element.data, EdgeData):
+            assert element.data.source in nodes and element.data.target in nodes
+            assert (
+                element.data.source.split("__")[0] == element.data.target.split("__")[0]
+            )
+        elif element.data.parent:
+            assert element.data.parent in nodes
+
+
+async def get_batch(**params):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.get("/graph/batch", params={"token": "t", **params})
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint(monkeypatch, world_client):
+    state = {"active": 0, "peak": 0}
+    patch_main(monkeypatch, world_client, make_world(), state, fail={"down.com"})
+
+    response = await get_batch(domains=["a.com", "b.com", "down.com"])
+    body = response.json()
+    assert response.status_code == 200
+    assert set(body["graphs"]) == {"a.com", "b.com"}
+    assert body["graph"] is None
+    assert body["errors"] == {"down.com": "Upstream PBX Unreachable"}
+
+    response = await get_batch(domains=["a.com", "b.com"], combine="true")
+    body = response.json()
+    assert body["graphs"] is None
+    assert {"a_com__did_5550001", "b_com__did_5550001"} <= {
+        e["data"]["id"] for e in body["graph"]
+    }
+
+    monkeypatch.setattr(main.settings, "GRAPH_BATCH_MAX_DOMAINS", 1)
+    assert (await get_batch(domains=["a.com", "b.com"])).status_code == 400
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from graph_cache import GraphCache
+
+
+class Builder:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return f"graph-v{self.calls}"
+
+
+@pytest.mark.asyncio
+async def test_fresh_graph_is_served_without_rebuilding(clock):
+    cache = GraphCache(fresh_ttl=60, clock=clock)
+    build = Builder()
+
+    assert await cache.get_or_build("k", build) == "graph-v1"
+    assert await cache.get_or_build("k", build) == "graph-v1"
+    assert build.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_stale_graph_is_served_while_rebuilding(clock):
+    cache = GraphCache(fresh_ttl=60, stale_ttl=600, clock=clock)
+    build = Builder(delay=0.01)
+    await cache.get_or_build("k", build)
+
+    clock.now += 61
+    assert await cache.get_or_build("k", build) == "graph-v1"
+    # A second stale hit doesn't start another rebuild
+    assert await cache.get_or_build("k", build) == "graph-v1"
+
+    await asyncio.sleep(0.05)
+    assert build.calls == 2
+    assert await cache.get_or_build("k", build) == "graph-v2"
+
+
+@pytest.mark.asyncio
+async def test_expired_graph_waits_for_rebuild(clock):
+    cache = GraphCache(fresh_ttl=60, stale_ttl=600, clock=clock)
+    build = Builder()
+    await cache.get_or_build("k", build)
+
+    clock.now += 661
+    assert await cache.get_or_build("k", build) == "graph-v2"
+
+
+@pytest.mark.asyncio
+async def test_refresh_forces_rebuild(clock):
+    cache = GraphCache(fresh_ttl=60, clock=clock)
+    build = Builder()
+    await cache.get_or_build("k", build)
+
+    assert await cache.get_or_build("k", build, refresh=True) == "graph-v2"
+    assert await cache.get_or_build("k", build) == "graph-v2"
+
+
+@pytest.mark.asyncio
+async def test_refresh_does_not_join_a_plain_build():
+    cache = GraphCache()
+    build = Builder(delay=0.01)
+
+    plain = asyncio.ensure_future(cache.get_or_build("k", build))
+    await asyncio.sleep(0)
+    refreshes = await asyncio.gather(
+        cache.get_or_build("k", build, refresh=True),
+        cache.get_or_build("k", build, refresh=True),
+    )
+
+    assert await plain == "graph-v1"
+    # Both refreshes share one build started after the plain one
+    assert refreshes == ["graph-v2", "graph-v2"]
+    assert build.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_build():
+    cache = GraphCache()
+    build = Builder(delay=0.01)
+
+    results = await asyncio.gather(*(cache.get_or_build("k", build) for _ in range(5)))
+
+    assert results == ["graph-v1"] * 5
+    assert build.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_background_rebuild_keeps_stale_graph(clock):
+    cache = GraphCache(fresh_ttl=60, stale_ttl=600, clock=clock)
+    build = Builder()
+    await cache.get_or_build("k", build)
+
+    build.fail = True
+    clock.now += 61
+    assert await cache.get_or_build("k", build) == "graph-v1"
+    await asyncio.sleep(0.01)
+
+    assert await cache.get_or_build("k", build) == "graph-v1"
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_graphs_are_dropped():
+    cache = GraphCache(max_entries=2)
+    build = Builder()
+    await cache.get_or_build("a", build)
+    await cache.get_or_build("b", build)
+    await cache.get_or_build("a", build)
+    await cache.get_or_build("c", build)
+
+    await cache.get_or_build("b", build)
+    assert build.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_peek_only_returns_fresh_graphs(clock):
+    cache = GraphCache(fresh_ttl=60, clock=clock)
+    assert cache.peek("k") is None
+
+    cache.put("k", "streamed")
+    assert cache.peek("k") == "streamed"
+    assert await cache.get_or_build("k", Builder()) == "streamed"
+
+    clock.now += 61
+    assert cache.peek("k") is None
+
+
+@pytest.mark.asyncio
+async def test_rebuild_runs_after_the_build_in_flight():
+    cache = GraphCache()
+    build = Builder(delay=0.01)
+
+    async def update():
+        return "updated"
+
+    running = asyncio.ensure_future(cache.get_or_build("k", build))
+    await asyncio.sleep(0)
+    assert await cache.rebuild("k", update) == "updated"
+
+    # The crawl started before the change doesn't overwrite the update
+    assert await running == "graph-v1"
+    assert await cache.get_or_build("k", build) == "updated"
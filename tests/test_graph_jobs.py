@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import main
+from build_progress import ProgressTracker
+from graph_builder import GraphBuilder
+from graph_jobs import JobQueue
+
+
+def slow_build(state, result="graph", delay=0.02):
+    async def build(job_id):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(delay)
+        state["active"] -= 1
+        return result
+
+    return build
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_with_a_concurrency_cap():
+    queue = JobQueue(max_running=2)
+    state = {"active": 0, "peak": 0}
+
+    submitted = [queue.submit(f"d{i}", f"d{i}", slow_build(state)) for i in range(5)]
+    await asyncio.sleep(0.1)
+
+    assert [job.state for job in submitted] == ["done"] * 5
+    assert state["peak"] == 2
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_identical_jobs_are_deduplicated_while_active():
+    queue = JobQueue()
+    state = {"active": 0, "peak": 0}
+
+    first = queue.submit("d", "d", slow_build(state))
+    assert queue.submit("d", "d", slow_build(state)) is first
+
+    await asyncio.sleep(0.05)
+    assert first.state == "done"
+    assert queue.submit("d", "d", slow_build(state)) is not first
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_new_jobs():
+    queue = JobQueue(max_running=1, max_queued=1)
+    state = {"active": 0, "peak": 0}
+    queue.submit("a", "a", slow_build(state))
+    await asyncio.sleep(0)  # "a" is now running
+    queue.submit("b", "b", slow_build(state))
+
+    with pytest.raises(HTTPException) as exc:
+        queue.submit("c", "c", slow_build(state))
+    assert exc.value.status_code == 503
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_failed_jobs_report_errors_and_finished_jobs_expire(clock):
+    queue = JobQueue(result_ttl=300, clock=clock)
+
+    async def fail(job_id):
+        raise RuntimeError("upstream down")
+
+    job = queue.submit("d", "d", fail)
+    await asyncio.sleep(0.01)
+    assert (job.state, job.error) == ("failed", "upstream down")
+
+    clock.now += 301
+    assert queue.get(job.id) is None
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_job_endpoints(monkeypatch, fan_in_client):
+    monkeypatch.setattr(main, "graph_cache", None)
+    monkeypatch.setattr(main, "progress", ProgressTracker())
+    monkeypatch.setattr(main, "jobs", JobQueue())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(fan_in_client()[0], "test.com"),
+    )
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        submitted = await http.post(
+            "/graph/jobs", params={"domain": "test.com", "token": "t"}
+        )
+        assert submitted.status_code == 202
+        job_id = submitted.json()["job_id"]
+
+        for _ in range(50):
+            status = (await http.get(f"/graph/jobs/{job_id}")).json()
+            if status["state"] == "done":
+                break
+            await asyncio.sleep(0.01)
+
+        missing = await http.get("/graph/jobs/nope")
+
+    assert status["state"] == "done"
+    assert status["result"][0]["data"]["type"] == "ingress"
+    assert missing.status_code == 404
+    snapshot = main.progress.snapshot(job_id)
+    assert snapshot is not None
+    assert snapshot["state"] == "done"
+    await main.jobs.aclose()
+
+
+@pytest.mark.asyncio
+async def test_refresh_job_does_not_join_a_cached_one(monkeypatch, fan_in_client):
+    monkeypatch.setattr(main, "graph_cache", None)
+    monkeypatch.setattr(main, "progress", ProgressTracker())
+    monkeypatch.setattr(main, "jobs", JobQueue())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(fan_in_client()[0], "test.com"),
+    )
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+
+        async def submit(**params):
+            response = await http.post(
+                "/graph/jobs", params={"domain": "test.com", "token": "t", **params}
+            )
+            return response.json()["job_id"]
+
+        cached = await submit()
+        refresh = await submit(refresh="true")
+        assert refresh != cached
+        assert await submit(refresh="true") == refresh
+
+    await main.jobs.aclose()
@@ -0,0 +1,101 @@
+import json
+import time
+from typing import List
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+
+import main
+from models import CytoscapeElement, EdgeData, NodeData, cytoscape_graph
+
+ELEMENTS = 20_000
+
+
+def make_graph():
+    graph = []
+    for i in range(ELEMENTS // 2):
+        graph.append(
+            CytoscapeElement(
+                data=NodeData(
+                    id=f"user_{i}",
+                    label=f"User: {i}",
+                    type="user",
+                    bg="#E3F2FD",
+                    link=f"/portal/users/edit/{i}",
+                    details={"Extension": str(i), "Department": "Sales"},
+                )
+            )
+        )
+        graph.append(
+            CytoscapeElement(
+                data=EdgeData(
+                    id=f"edge_user_{i}_user_{i + 1}",
+                    source=f"user_{i}",
+                    target=f"user_{i + 1}",
+                    label="Forward Always",
+                    timeframe="*",
+                    priority=1,
+                )
+            )
+        )
+    return graph
+
+
+async def timed_get(app, path):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        start = time.perf_counter()
+        response = await http.get(path, params={"domain": "test.com", "token": "t"})
+        return response, time.perf_counter() - start
+
+
+@pytest.mark.asyncio
+async def test_fast_serialization_matches_response_model_path(monkeypatch):
+    graph = make_graph()
+
+    async def cached_graph(*args, **kwargs):
+        return graph
+
+    monkeypatch.setattr(main, "get_or_build_graph", cached_graph)
+
+    # What /graph did before: let FastAPI validate and encode via response_model
+    legacy = FastAPI()
+
+    @legacy.get("/graph", response_model=List[CytoscapeElement])
+    async def legacy_graph():
+        return graph
+
+    legacy_response, legacy_time = await timed_get(legacy, "/graph")
+    fast_response, fast_time = await timed_get(main.app, "/graph")
+
+    print(
+        f"\n{ELEMENTS} elements: response_model {legacy_time:.3f}s, "
+        f"TypeAdapter.dump_json {fast_time:.3f}s"
+    )
+    assert fast_response.headers["content-type"] == "application/json"
+    assert json.loads(fast_response.content) == json.loads(legacy_response.content)
+    # Recent FastAPI releases serialize response models through pydantic-core
+    # too, so on those the two paths are close
+    assert fast_time < legacy_time * 1.5
+
+
+def test_dump_json_beats_jsonable_encoder():
+    # Older FastAPI releases encode response_model output with jsonable_encoder
+    graph = make_graph()
+
+    start = time.perf_counter()
+    encoded = json.dumps(jsonable_encoder(graph)).encode()
+    encoder_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dumped = cytoscape_graph.dump_json(graph)
+    dump_time = time.perf_counter() - start
+
+    print(
+        f"\n{ELEMENTS} elements: jsonable_encoder {encoder_time:.3f}s, "
+        f"TypeAdapter.dump_json {dump_time:.3f}s"
+    )
+    assert json.loads(dumped) == json.loads(encoded)
+    assert dump_time * 3 < encoder_time
@@ -0,0 +1,130 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from test_concurrent_build import element_ids
+from test_subgraph_memo import MAIN_AA
+
+import main
+from graph_builder import GraphBuilder
+from graph_cache import GraphCache
+from models import (
+    EdgeData,
+    NSAnswerRule,
+    NSForwardingLogic,
+    NSPhoneNumber,
+    NSUser,
+)
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_the_built_graph_once_per_element(fan_in_client):
+    built = await GraphBuilder(fan_in_client()[0], "test.com").build()
+
+    streamed = []
+    seen_nodes = set()
+    builder = GraphBuilder(fan_in_client()[0], "test.com", max_concurrency=8)
+    async for element in builder.stream():
+        if isinstance(element.data, EdgeData):
+            # Edges never arrive before the nodes they connect
+            assert element.data.source in seen_nodes
+            assert element.data.target in seen_nodes
+        else:
+            seen_nodes.add(element.data.id)
+        streamed.append(element)
+
+    assert len(element_ids(streamed)) == len(set(element_ids(streamed)))
+    assert sorted(element_ids(streamed)) == sorted(element_ids(built))
+
+
+async def get_stream(path="/graph/stream"):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.get(path, params={"domain": "test.com", "token": "t"})
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_sends_ndjson_and_caches_the_graph(
+    monkeypatch, fan_in_client
+):
+    mock_client = fan_in_client()[0]
+    monkeypatch.setattr(main, "graph_cache", GraphCache())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(mock_client, "test.com"),
+    )
+
+    response = await get_stream()
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["data"]["type"] == "ingress"
+    assert not any("error" in line for line in lines)
+
+    # A second stream replays the cached graph without crawling
+    again = await get_stream()
+    assert len(again.text.splitlines()) == len(lines)
+    assert mock_client.get_dids.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_reports_failures_in_band(monkeypatch, fan_in_client):
+    mock_client = fan_in_client()[0]
+    mock_client.get_dids = AsyncMock(side_effect=RuntimeError("upstream down"))
+    monkeypatch.setattr(main, "graph_cache", GraphCache())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(mock_client, "test.com"),
+    )
+    response = await get_stream()
+
+    assert response.status_code == 200
+    assert json.loads(response.text.splitlines()[-1]) == {"error": "upstream down"}
+
+
+@pytest.mark.asyncio
+async def test_streamed_graph_is_cached_as_sent(monkeypatch, mock_ns_client):
+    # DID 1 reaches the menu through its owner's slow answer rules, DID 2
+    # directly, so the stream draws the menu before knowing its owner
+    async def get_answer_rules(domain, user):
+        await asyncio.sleep(0.01)
+        return [
+            NSAnswerRule(
+                domain="test.com",
+                user=user,
+                time_frame="*",
+                forward_always=NSForwardingLogic(
+                    enabled="yes", parameters=["100:Prompt_1"]
+                ),
+            )
+        ]
+
+    mock_client = mock_ns_client(
+        get_users=[NSUser(user="100", domain="test.com")],
+        get_dids=[
+            NSPhoneNumber(phonenumber="5550001", domain="test.com", dest="100"),
+            NSPhoneNumber(
+                phonenumber="5550002", domain="test.com", dest="100:Prompt_1"
+            ),
+        ],
+        get_auto_attendant_prompts=MAIN_AA,
+        get_answer_rules=get_answer_rules,
+    )
+    monkeypatch.setattr(main, "graph_cache", GraphCache())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(
+            mock_client, "test.com", max_concurrency=8
+        ),
+    )
+
+    streamed = [json.loads(line) for line in (await get_stream()).text.splitlines()]
+    cached = (await get_stream("/graph")).json()
+
+    assert cached == streamed
+    assert mock_client.get_dids.await_count == 1
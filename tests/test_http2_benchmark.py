@@ -0,0 +1,112 @@
+import asyncio
+import json
+import socket
+import time
+
+import httpx
+import pytest
+
+from http_pool import HTTPClientPool
+from ns_client import NSClient
+
+hypercorn = pytest.importorskip("hypercorn")
+pytest.importorskip("h2")
+
+from hypercorn.asyncio import serve  # noqa: E402
+from hypercorn.config import Config  # noqa: E402
+
+REQUESTS = 200
+RULE = json.dumps(
+    [{"domain": "test.com", "user": "101", "time-frame": "*", "ordinal-priority": 1}]
+).encode()
+
+
+async def standin_api(scope, receive, send):
+    """Stand-in NetSapiens API: every path answers with one rule after 5ms."""
+    if scope["type"] != "http":
+        return
+    await asyncio.sleep(0.005)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": RULE})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def crawl(client: NSClient):
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client.get_answer_rules("test.com", str(i)) for i in range(REQUESTS))
+    )
+    return time.perf_counter() - start
+
+
+@pytest.fixture
+async def standin_url():
+    port = free_port()
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.loglevel = "ERROR"
+    stop = asyncio.Event()
+    server = asyncio.create_task(serve(standin_api, config, shutdown_trigger=stop.wait))
+    api_url = f"http://127.0.0.1:{port}"
+
+    # Wait for the listener
+    for _ in range(50):
+        try:
+            async with httpx.AsyncClient() as probe:
+                await probe.get(api_url)
+            break
+        except httpx.ConnectError:
+            await asyncio.sleep(0.05)
+
+    yield api_url
+
+    stop.set()
+    await server
+
+
+@pytest.mark.asyncio
+async def test_http2_vs_http1_pool(standin_url):
+    pool = HTTPClientPool(max_connections=20)
+    http1 = NSClient("token", standin_url, client=pool.get(standin_url))
+    http1_time = await crawl(http1)
+    await pool.aclose()
+
+    # The stand-in is plaintext, so there is no ALPN to negotiate h2 with;
+    # use prior knowledge (h2c) to get the same multiplexing a TLS
+    # NetSapiens cluster would offer to create_http_client(http2=True).
+    async with httpx.AsyncClient(http1=False, http2=True) as h2c:
+        http2 = NSClient("token", standin_url, client=h2c)
+        http2_time = await crawl(http2)
+
+    print(
+        f"\n{REQUESTS} answer-rule calls: "
+        f"HTTP/1.1 pool {http1_time:.3f}s, HTTP/2 {http2_time:.3f}s"
+    )
+    assert http1.http_versions == {"HTTP/1.1": REQUESTS}
+    assert http2.http_versions == {"HTTP/2": REQUESTS}
+    assert http2_time < http1_time * 1.5
+
+
+@pytest.mark.asyncio
+async def test_http2_falls_back_when_not_negotiated(standin_url):
+    # Without ALPN the server never agrees to h2, so an http2-enabled
+    # client quietly speaks HTTP/1.1.
+    pool = HTTPClientPool(http2=True)
+    client = NSClient("token", standin_url, client=pool.get(standin_url))
+
+    rules = await client.get_answer_rules("test.com", "101")
+
+    assert rules[0].user == "101"
+    assert client.http_versions == {"HTTP/1.1": 1}
+    await pool.aclose()
@@ -0,0 +1,73 @@
+import httpx
+import pytest
+
+from http_pool import HTTPClientPool
+from ns_client import NSClient, create_http_client
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_client_per_host():
+    pool = HTTPClientPool()
+
+    first = pool.get("api.netsapiens.com")
+    assert pool.get("https://api.netsapiens.com/ns-api/v2") is first
+    assert pool.get("https://API.netsapiens.com/") is first
+    assert pool.get("https://other.pbx.com") is not first
+
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_applies_limits():
+    pool = HTTPClientPool(max_connections=7, max_keepalive_connections=3)
+
+    assert pool.limits.max_connections == 7
+    assert pool.limits.max_keepalive_connections == 3
+
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_close_and_reopen():
+    pool = HTTPClientPool()
+    client = pool.get("api.netsapiens.com")
+
+    await pool.aclose()
+    assert client.is_closed
+
+    reopened = pool.get("api.netsapiens.com")
+    assert reopened is not client
+    assert not reopened.is_closed
+
+    await pool.aclose()
+
+
+def test_host_key():
+    assert HTTPClientPool.host_key("api.netsapiens.com") == "https://api.netsapiens.com"
+    assert (
+        HTTPClientPool.host_key("http://pbx.local:8080/ns-api/v2")
+        == "http://pbx.local:8080"
+    )
+    assert HTTPClientPool.host_key(None) == ""
+
+
+@pytest.mark.asyncio
+async def test_pooled_client_never_carries_cookies_between_tenants():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("Cookie"))
+        return httpx.Response(
+            200, json=[], headers={"Set-Cookie": "PHPSESSID=tenantA; Path=/"}
+        )
+
+    shared = create_http_client(transport=httpx.MockTransport(handler))
+    tenant_a = NSClient("tokenA", "https://api.netsapiens.com", client=shared)
+    tenant_b = NSClient("tokenB", "https://api.netsapiens.com", client=shared)
+
+    await tenant_a.get_answer_rules("a.com", "101")
+    await tenant_b.get_answer_rules("b.com", "101")
+
+    assert seen == [None, None]
+    assert not shared.cookies
+    await shared.aclose()
@@ -0,0 +1,244 @@
+import asyncio
+from typing import List, Tuple
+
+import httpx
+import pytest
+
+import main
+from graph_builder import GraphBuilder
+from graph_cache import GraphCache
+from models import (
+    NSAnswerRule,
+    NSAutoAttendantResponse,
+    NSCallQueueAgent,
+    NSForwardingLogic,
+    NSPhoneNumber,
+    NSUser,
+)
+
+
+def forward(user, target):
+    return [
+        NSAnswerRule(
+            domain="test.com",
+            user=user,
+            time_frame="*",
+            forward_always=NSForwardingLogic(enabled="yes", parameters=[target]),
+        )
+    ]
+
+
+def menu(option_1, nested_user):
+    return NSAutoAttendantResponse.model_validate(
+        {
+            "attendant-name": "Main Menu",
+            "user": "001",
+            "starting-prompt": "Prompt_1",
+            "auto-attendant": {
+                "option-1": {
+                    "destination-application": "to-user",
+                    "destination-user": option_1,
+                },
+                "option-2": {
+                    "auto-attendant": {
+                        "option-1": {
+                            "destination-application": "to-user",
+                            "destination-user": nested_user,
+                        }
+                    }
+                },
+            },
+        }
+    )
+
+
+def make_world():
+    """
+    DID 1 -> user 101 -> user 100 -> voicemail
+    DID 2 -> AA 001:Prompt_1 -> 102, nested menu -> 103
+    DID 3 -> queue 300 (agents 100, 102)
+    """
+    return {
+        "dids": [
+            NSPhoneNumber(phonenumber="5550001", domain="test.com", dest="101"),
+            NSPhoneNumber(
+                phonenumber="5550002", domain="test.com", dest="001:Prompt_1"
+            ),
+            NSPhoneNumber(phonenumber="5550003", domain="test.com", dest="queue_300"),
+        ],
+        "users": [
+            NSUser(user=user, domain="test.com")
+            for user in ("100", "101", "102", "103", "104")
+        ],
+        "rules": {
+            "100": forward("100", "vmail_100"),
+            "101": forward("101", "100"),
+            "102": forward("102", "vmail_102"),
+            "103": forward("103", "vmail_103"),
+            "104": forward("104", "vmail_104"),
+        },
+        "aa": {"001:Prompt_1": menu("102", "103")},
+        "queues": {"300": [NSCallQueueAgent(user="100"), NSCallQueueAgent(user="102")]},
+    }
+
+
+def as_set(elements):
+    return {e.model_dump_json() for e in elements}
+
+
+async def full_build(client):
+    return await GraphBuilder(client, "test.com").build()
+
+
+@pytest.mark.asyncio
+async def test_changed_user_rebuilds_only_its_subgraph(world_client):
+    world = make_world()
+    calls: List[Tuple[str, str]] = []
+    builder = GraphBuilder(world_client(world, calls), "test.com", max_concurrency=4)
+    await builder.build()
+
+    world["rules"]["101"] = forward("101", "104")
+    calls.clear()
+    graph = await builder.rebuild([("rules", "101")])
+
+    # 101's rules, plus the one user its new rules lead to
+    assert sorted(calls) == [("rules", "101"), ("rules", "104")]
+    assert as_set(graph) == as_set(await full_build(world_client(world)))
+    assert builder.dependent_dids([("rules", "101")]) == ["did_5550001"]
+
+
+@pytest.mark.asyncio
+async def test_changed_menu_rebuilds_nested_menus(world_client):
+    world = make_world()
+    calls: List[Tuple[str, str]] = []
+    builder = GraphBuilder(world_client(world, calls), "test.com")
+    await builder.build()
+
+    world["aa"]["001:Prompt_1"] = menu("104", "101")
+    calls.clear()
+    graph = await builder.rebuild([("aa", "001:Prompt_1")])
+
+    assert calls.count(("aa", "001:Prompt_1")) == 1
+    # 101 was already walked from DID 1; only 104 is new
+    assert ("rules", "104") in calls
+    assert ("rules", "101") not in calls
+    assert as_set(graph) == as_set(await full_build(world_client(world)))
+
+
+@pytest.mark.asyncio
+async def test_changed_queue_and_shared_user(world_client):
+    world = make_world()
+    builder = GraphBuilder(world_client(world), "test.com")
+    await builder.build()
+
+    # 100 is reached from DID 1 and is an agent of queue 300
+    assert builder.dependent_dids([("rules", "100")]) == ["did_5550001", "did_5550003"]
+
+    world["queues"]["300"] = [NSCallQueueAgent(user="103")]
+    world["rules"]["100"] = forward("100", "hangup")
+    graph = await builder.rebuild([("queue", "300"), ("rules", "100")])
+
+    assert as_set(graph) == as_set(await full_build(world_client(world)))
+
+
+@pytest.mark.asyncio
+async def test_changed_resources_are_found_by_revalidation(world_client):
+    world = make_world()
+    builder = GraphBuilder(world_client(world), "test.com")
+    await builder.build()
+
+    assert await builder.changed_resources() == {}
+
+    world["rules"]["102"] = forward("102", "101")
+    calls: List[Tuple[str, str]] = []
+    graph = await builder.update(client=world_client(world, calls))
+
+    # Re-fetched once to find the change, then reused by the rebuild
+    assert calls.count(("rules", "102")) == 1
+    assert as_set(graph) == as_set(await full_build(world_client(world)))
+
+    # A new DID can't be spliced in
+    world["dids"].append(
+        NSPhoneNumber(phonenumber="5550004", domain="test.com", dest="104")
+    )
+    assert await builder.update() is None
+
+
+@pytest.mark.asyncio
+async def test_node_claimed_through_a_removed_edge_is_redrawn(world_client):
+    # DID 1 reaches 105's menu through user 104, DID 2 directly
+    world = make_world()
+    world["dids"][1] = NSPhoneNumber(
+        phonenumber="5550002", domain="test.com", dest="105:Prompt_1"
+    )
+    world["rules"]["104"] = forward("104", "105:Prompt_1")
+    world["dids"][0] = NSPhoneNumber(
+        phonenumber="5550001", domain="test.com", dest="104"
+    )
+    world["aa"]["105:Prompt_1"] = menu("102", "103")
+    builder = GraphBuilder(world_client(world), "test.com")
+    await builder.build()
+
+    world["rules"]["104"] = forward("104", "vmail_104")
+    graph = await builder.rebuild([("rules", "104")])
+
+    assert as_set(graph) == as_set(await full_build(world_client(world)))
+
+
+@pytest.mark.asyncio
+async def test_subgraph_waits_for_a_running_update(world_client):
+    world = make_world()
+    builder = GraphBuilder(world_client(world), "test.com")
+    await builder.build()
+
+    world["rules"]["101"] = forward("101", "104")
+    update = asyncio.ensure_future(builder.update([("rules", "101")]))
+    # Let the update start changing the memo
+    await asyncio.sleep(0)
+    graph = await builder.subgraph("5550001")
+
+    assert update.done()
+    single = GraphBuilder(world_client(world), "test.com")
+    assert as_set(graph) == as_set(await single.build_did("5550001"))
+
+
+async def post_invalidate(**params):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.post(
+            "/graph/invalidate", params={"domain": "test.com", "token": "t", **params}
+        )
+
+
+@pytest.mark.asyncio
+async def test_invalidate_endpoint_updates_the_cached_graph(monkeypatch, world_client):
+    world = make_world()
+    calls: List[Tuple[str, str]] = []
+    monkeypatch.setattr(main, "graph_cache", GraphCache())
+    monkeypatch.setattr(
+        main,
+        "create_builder",
+        lambda *args, **kwargs: GraphBuilder(world_client(world, calls), "test.com"),
+    )
+    monkeypatch.setattr(
+        main, "create_client", lambda *args, **kwargs: world_client(world, calls)
+    )
+
+    # Nothing cached yet: the next /graph crawls in full
+    response = await post_invalidate(users="101")
+    assert response.json()["incremental"] is False
+
+    await main.get_or_build_graph("test.com", "t", None)
+    world["rules"]["101"] = forward("101", "104")
+    calls.clear()
+    response = await post_invalidate(users="101")
+
+    assert response.status_code == 200
+    assert response.json()["incremental"] is True
+    assert response.json()["dids"] == ["5550001"]
+    assert sorted(calls) == [("rules", "101"), ("rules", "104")]
+    cached = await main.get_or_build_graph("test.com", "t", None)
+    assert as_set(cached) == as_set(await full_build(world_client(world)))
+
+    assert (await post_invalidate()).status_code == 400
+    assert (await post_invalidate(auto_attendants="Prompt_1")).status_code == 400
@@ -0,0 +1,86 @@
+import asyncio
+from typing import List
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from graph_builder import GraphBuilder
+from models import NodeData, NSAnswerRule, NSForwardingLogic, NSPhoneNumber, NSUser
+
+
+@pytest.fixture
+def make_client(mock_ns_client):
+    def make(events) -> MagicMock:
+        async def get_users(domain):
+            events.append("users start")
+            await asyncio.sleep(0.05)
+            events.append("users done")
+            return [
+                NSUser(user="101", domain=domain, name_first_name="Ada"),
+                NSUser(user="200", domain=domain, name_first_name="Bob"),
+            ]
+
+        async def get_dids(domain):
+            events.append("dids start")
+            await asyncio.sleep(0.01)
+            return [
+                # "user_" names its type; a bare extension needs the users list
+                NSPhoneNumber(phonenumber="5550001000", domain=domain, dest="user_200"),
+                NSPhoneNumber(phonenumber="5550002000", domain=domain, dest="101"),
+            ]
+
+        async def get_answer_rules(domain, user):
+            events.append(f"rules {user}")
+            return [
+                NSAnswerRule(
+                    domain=domain,
+                    user=user,
+                    time_frame="*",
+                    forward_always=NSForwardingLogic(
+                        enabled="yes", parameters=[f"vmail_{user}"]
+                    ),
+                )
+            ]
+
+        return mock_ns_client(
+            get_users=get_users,
+            get_dids=get_dids,
+            get_answer_rules=get_answer_rules,
+        )
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_walks_start_before_users_arrive(make_client):
+    events: List[str] = []
+    builder = GraphBuilder(make_client(events), "test.com", max_concurrency=4)
+
+    elements = await builder.build()
+
+    # DIDs are requested without waiting for users
+    assert events.index("dids start") < events.index("users done")
+    # A self-describing destination is walked straight away...
+    assert events.index("rules 200") < events.index("users done")
+    # ...while the bare extension waits to be recognised as a user
+    assert events.index("rules 101") > events.index("users done")
+
+    labels = {e.data.id: e.data.label for e in elements if isinstance(e.data, NodeData)}
+    assert labels["user_101"] == "Ada (101)"
+    assert labels["user_200"] == "Bob (200)"
+
+
+@pytest.mark.asyncio
+async def test_failed_did_fetch_stops_the_global_fetch(make_client):
+    events: List[str] = []
+    mock_client = make_client(events)
+    mock_client.get_dids = AsyncMock(side_effect=RuntimeError("upstream down"))
+    builder = GraphBuilder(mock_client, "test.com")
+
+    with pytest.raises(RuntimeError):
+        await builder.build()
+
+    await asyncio.sleep(0)
+    assert builder._global_data is not None
+    assert builder._global_data.cancelled()
+    assert "users done" not in events
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from models import NSUser
+from ns_client import NSClient
+
+
+@pytest.fixture
+def make_client(mock_api_client):
+    def make(total, page_concurrency, state) -> NSClient:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            start = int(request.url.params["start"])
+            limit = int(request.url.params["limit"])
+            state["starts"].append(start)
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            users = [
+                {"user": str(i), "domain": "test.com"}
+                for i in range(start, min(start + limit, total))
+            ]
+            return httpx.Response(200, content=json.dumps(users).encode())
+
+        return mock_api_client(handler, page_concurrency=page_concurrency)
+
+    return make
+
+
+def new_state():
+    return {"starts": [], "active": 0, "peak": 0}
+
+
+@pytest.mark.asyncio
+async def test_pages_are_fetched_concurrently_in_order(make_client):
+    state = new_state()
+    client = make_client(8_500, page_concurrency=4, state=state)
+
+    users = await client._get_paginated(
+        "/domains/test.com/users", model=NSUser, limit=1000
+    )
+
+    assert [u.user for u in users] == [str(i) for i in range(8_500)]
+    assert state["peak"] == 4
+    # First page alone, then waves of four; the second ends on the short page
+    assert sorted(state["starts"]) == [i * 1000 for i in range(9)]
+
+
+@pytest.mark.asyncio
+async def test_sequential_mode_is_unchanged(make_client):
+    state = new_state()
+    client = make_client(2_500, page_concurrency=1, state=state)
+
+    users = await client.get_users("test.com")
+
+    assert len(users) == 2_500
+    assert state["peak"] == 1
+    assert state["starts"] == [0, 1000, 2000]
+
+
+@pytest.mark.asyncio
+async def test_max_items_guard_still_applies(make_client):
+    state = new_state()
+    client = make_client(50_000, page_concurrency=8, state=state)
+
+    with pytest.raises(HTTPException) as exc:
+        await client._get_paginated(
+            "/domains/test.com/users",
+            model=NSUser,
+            limit=1000,
+            max_items=10_000,
+        )
+
+    assert exc.value.status_code == 413
+    # Never asks for pages beyond the one that trips the guard
+    assert max(state["starts"]) == 10_000
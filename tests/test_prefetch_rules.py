@@ -0,0 +1,75 @@
+import pytest
+from fastapi import HTTPException
+
+from graph_builder import GraphBuilder
+from models import NSAnswerRule, NSForwardingLogic, NSPhoneNumber, NSUser
+
+# DID -> 101 -> 102 -> voicemail. 103 is not reachable from any DID.
+FORWARDS = {"101": "102", "102": "vmail_102", "103": "vmail_103"}
+
+
+@pytest.fixture
+def mock_client(mock_ns_client):
+    return mock_ns_client(
+        get_users=[NSUser(user=u, domain="test.com") for u in FORWARDS],
+        get_dids=[
+            NSPhoneNumber(phonenumber="5550001000", domain="test.com", dest="101")
+        ],
+        get_answer_rules=lambda domain, user: [
+            NSAnswerRule(
+                domain=domain,
+                user=user,
+                time_frame="*",
+                forward_always=NSForwardingLogic(
+                    enabled="yes", parameters=[FORWARDS[user]]
+                ),
+            )
+        ],
+    )
+
+
+def fetched_users(mock_client):
+    return [call.args[1] for call in mock_client.get_answer_rules.call_args_list]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_loads_every_user_on_small_domains(mock_client):
+    builder = GraphBuilder(
+        mock_client, "test.com", max_concurrency=4, prefetch_rules=True
+    )
+
+    await builder.build()
+
+    # Everything was loaded up front; the walk itself made no extra calls
+    assert sorted(fetched_users(mock_client)) == ["101", "102", "103"]
+    assert set(builder.rules_cache) == {"101", "102", "103"}
+
+
+@pytest.mark.asyncio
+async def test_prefetch_follows_did_reachable_users_on_large_domains(mock_client):
+    builder = GraphBuilder(
+        mock_client, "test.com", prefetch_rules=True, prefetch_max_users=2
+    )
+    await builder._fetch_global_data()
+
+    await builder._prefetch_answer_rules(await mock_client.get_dids("test.com"))
+
+    assert fetched_users(mock_client) == ["101", "102"]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_failures_are_left_to_the_walk(mock_client):
+    mock_client.get_answer_rules.side_effect = HTTPException(status_code=503)
+    builder = GraphBuilder(mock_client, "test.com", prefetch_rules=True)
+    await builder._fetch_global_data()
+
+    await builder._prefetch_answer_rules([])
+
+    assert builder.rules_cache == {}
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_off_by_default(mock_client):
+    await GraphBuilder(mock_client, "test.com").build()
+
+    assert "103" not in fetched_users(mock_client)
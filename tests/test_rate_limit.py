@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from rate_limit import HostLimiter, HostLimiters
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_the_burst_are_paced():
+    limiter = HostLimiter(rate=50, burst=5, max_in_flight=0)
+
+    async def request():
+        async with limiter.slot() as waited:
+            return waited
+
+    start = time.monotonic()
+    waits = await asyncio.gather(*(request() for _ in range(15)))
+    elapsed = time.monotonic() - start
+
+    # Five go out at once, the other ten at 50/s
+    assert elapsed >= 0.18
+    assert sum(1 for w in waits if w < 0.001) == 5
+    assert limiter.requests == 15
+    assert limiter.queued == 10
+    assert limiter.max_queue_delay >= 0.18
+
+
+@pytest.mark.asyncio
+async def test_in_flight_cap_queues_instead_of_failing():
+    limiter = HostLimiter(rate=0, max_in_flight=3)
+    state = {"active": 0, "peak": 0}
+
+    async def request():
+        async with limiter.slot():
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+
+    await asyncio.gather(*(request() for _ in range(10)))
+
+    assert state["peak"] == 3
+    assert limiter.requests == 10
+    assert limiter.queue_delay > 0
+
+
+@pytest.mark.asyncio
+async def test_failed_request_frees_its_slot():
+    limiter = HostLimiter(rate=0, max_in_flight=1)
+
+    with pytest.raises(RuntimeError):
+        async with limiter.slot():
+            raise RuntimeError("boom")
+
+    async with limiter.slot() as waited:
+        assert waited < 0.001
+
+
+def test_limiters_are_per_host_with_overrides():
+    limiters = HostLimiters(
+        rate=10, burst=10, max_in_flight=4, overrides={"API.example.com": {"rate": 99}}
+    )
+
+    a = limiters.get("https://pbx.example.com/ns-api/v2")
+    b = limiters.get("https://PBX.example.com:8443/other")
+    c = limiters.get("https://api.example.com/ns-api/v2")
+
+    assert a is b
+    assert a.rate == 10
+    assert c.rate == 99
+    assert c.max_in_flight == 4
+
+
+@pytest.mark.asyncio
+async def test_clients_share_the_host_limit(mock_api_client):
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return httpx.Response(200, json=[])
+
+    limiters = HostLimiters(rate=0, max_in_flight=2)
+    clients = [mock_api_client(handler, limiters=limiters) for _ in range(3)]
+
+    await asyncio.gather(
+        *(
+            client.get_answer_rules("test.com", f"{i}{n}")
+            for i, client in enumerate(clients)
+            for n in range(3)
+        )
+    )
+
+    assert state["peak"] == 2
+    assert limiters.stats()["pbx.example.com"]["requests"] == 9
+    assert sum(client.queue_wait for client in clients) > 0
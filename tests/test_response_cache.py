@@ -0,0 +1,108 @@
+from typing import List
+
+import httpx
+import pytest
+
+from ns_client import NSClient
+from response_cache import ResponseCache
+
+RULE = {"domain": "test.com", "user": "101", "time-frame": "*"}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(default_ttl=10, clock=clock)
+    cache.put("k", [], size=10, ttl=10)
+
+    assert cache.get("k") == (True, [])
+    clock.now += 11
+    assert cache.get("k") == (False, None)
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_bytes=100)
+    cache.put("a", 1, size=40, ttl=60)
+    cache.put("b", 2, size=40, ttl=60)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", 3, size=40, ttl=60)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.total_bytes == 80
+    assert cache.evictions == 1
+
+
+def test_oversized_entries_are_not_stored():
+    cache = ResponseCache(max_bytes=100)
+    cache.put("big", "x", size=101, ttl=60)
+    assert cache.get("big") == (False, None)
+
+
+def test_ttl_is_chosen_per_endpoint():
+    cache = ResponseCache(
+        default_ttl=5, ttls={"answerrules": 30, "autoattendants": 20, "users": 60}
+    )
+    assert cache.ttl_for("/domains/d/users/101/answerrules") == 30
+    assert cache.ttl_for("/domains/d/users/101/autoattendants/Prompt_1") == 20
+    assert cache.ttl_for("/domains/d/users") == 60
+    assert cache.ttl_for("/domains/d/phonenumbers") == 5
+
+
+@pytest.fixture
+def make_client(mock_api_client):
+    def make(cache, hits, **kwargs) -> NSClient:
+        def handler(request: httpx.Request) -> httpx.Response:
+            hits.append(request.url.path)
+            if request.url.path.endswith("/missing/answerrules"):
+                return httpx.Response(404)
+            return httpx.Response(200, json=[RULE])
+
+        return mock_api_client(handler, cache=cache, **kwargs)
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_client_serves_repeat_requests_from_cache(make_client):
+    cache = ResponseCache()
+    hits: List[str] = []
+
+    first = make_client(cache, hits)
+    await first.get_answer_rules("test.com", "101")
+
+    # A later request (new NSClient) with the same API and token
+    second = make_client(cache, hits)
+    rules = await second.get_answer_rules("test.com", "101")
+
+    assert rules[0].user == "101"
+    assert len(hits) == 1
+    assert (second.cache_hits, second.cache_misses) == (1, 0)
+    assert second.total_calls == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_is_scoped_by_token_and_api_url(make_client):
+    cache = ResponseCache()
+    hits: List[str] = []
+
+    await make_client(cache, hits).get_answer_rules("test.com", "101")
+    await make_client(cache, hits, token="other").get_answer_rules("test.com", "101")
+    await make_client(cache, hits, api_url="pbx2.example.com").get_answer_rules(
+        "test.com", "101"
+    )
+
+    assert len(hits) == 3
+
+
+@pytest.mark.asyncio
+async def test_not_found_responses_are_cached(make_client):
+    cache = ResponseCache()
+    hits: List[str] = []
+
+    for _ in range(2):
+        rules = await make_client(cache, hits).get_answer_rules("test.com", "missing")
+        assert rules == []
+
+    assert len(hits) == 1
@@ -0,0 +1,112 @@
+from typing import List
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from ns_client import NSClient
+
+RULE = {"domain": "test.com", "user": "101", "time-frame": "*"}
+
+
+@pytest.fixture
+def make_client(mock_api_client):
+    def make(responses, hits, **kwargs) -> NSClient:
+        """Serves the queued responses in order, then 200s."""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            hits.append(request.url.path)
+            if responses:
+                response = responses.pop(0)
+                if isinstance(response, Exception):
+                    raise response
+                return response
+            return httpx.Response(200, json=[RULE])
+
+        kwargs.setdefault("retries", 2)
+        kwargs.setdefault("retry_backoff", 0.001)
+        return mock_api_client(handler, **kwargs)
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_transient_failures_are_retried(make_client):
+    hits: List[str] = []
+    client = make_client(
+        [httpx.Response(502), httpx.ConnectError("connection reset")], hits
+    )
+
+    rules = await client.get_answer_rules("test.com", "101")
+
+    assert rules[0].user == "101"
+    assert len(hits) == 3
+    assert client.retried_calls == 2
+    assert client.total_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(make_client):
+    hits: List[str] = []
+    client = make_client([httpx.Response(500)] * 5, hits, retries=2)
+
+    with pytest.raises(HTTPException) as exc:
+        await client.get_answer_rules("test.com", "101")
+
+    assert exc.value.status_code == 503
+    assert len(hits) == 3
+
+
+@pytest.mark.asyncio
+async def test_retry_after_sets_the_minimum_wait(make_client):
+    hits: List[str] = []
+    client = make_client(
+        [httpx.Response(429, headers={"Retry-After": "0.05"}, text="slow down")], hits
+    )
+
+    await client.get_answer_rules("test.com", "101")
+
+    assert len(hits) == 2
+    assert client.retry_wait >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_fails_fast(make_client):
+    hits: List[str] = []
+    client = make_client(
+        [httpx.Response(503, headers={"Retry-After": "120"})], hits, retry_max_delay=10
+    )
+
+    with pytest.raises(HTTPException) as exc:
+        await client.get_answer_rules("test.com", "101")
+
+    assert exc.value.status_code == 503
+    assert len(hits) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_is_shared_by_all_calls(make_client):
+    hits: List[str] = []
+    client = make_client([httpx.Response(500)] * 10, hits, retries=3, retry_budget=2)
+
+    with pytest.raises(HTTPException):
+        await client.get_answer_rules("test.com", "101")
+
+    # One attempt plus the two retries the budget allows, then nothing more
+    assert len(hits) == 3
+    assert client.retry_budget == 0
+    with pytest.raises(HTTPException):
+        await client.get_answer_rules("test.com", "102")
+    assert len(hits) == 4
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(make_client):
+    hits: List[str] = []
+    client = make_client([httpx.Response(401, text="bad token")], hits)
+
+    with pytest.raises(HTTPException) as exc:
+        await client.get_answer_rules("test.com", "101")
+
+    assert exc.value.status_code == 401
+    assert len(hits) == 1
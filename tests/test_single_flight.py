@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+RULE = {
+    "domain": "test.com",
+    "user": "101",
+    "time-frame": "*",
+    "ordinal-priority": 1,
+}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call(mock_api_client):
+    hits = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        hits.append(request.url.path)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=[RULE])
+
+    client = mock_api_client(handler)
+    results = await asyncio.gather(
+        *(client.get_answer_rules("test.com", "101") for _ in range(5))
+    )
+
+    assert len(hits) == 1
+    assert all(r[0].user == "101" for r in results)
+    assert client.total_calls == 1
+    assert client.coalesced_calls == 4
+    assert client._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_different_resources_are_not_coalesced(mock_api_client):
+    hits = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        hits.append(request.url.path)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=[RULE])
+
+    client = mock_api_client(handler)
+    await asyncio.gather(
+        client.get_answer_rules("test.com", "101"),
+        client.get_answer_rules("test.com", "102"),
+        client._request("GET", "/domains/test.com/users", params={"start": 0}),
+        client._request("GET", "/domains/test.com/users", params={"start": 1000}),
+    )
+
+    assert len(hits) == 4
+    assert client.coalesced_calls == 0
+
+
+@pytest.mark.asyncio
+async def test_sequential_requests_are_not_coalesced(mock_api_client):
+    hits = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        hits.append(request.url.path)
+        return httpx.Response(200, json=[RULE])
+
+    client = mock_api_client(handler)
+    await client.get_answer_rules("test.com", "101")
+    await client.get_answer_rules("test.com", "101")
+
+    assert len(hits) == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_by_all_waiters(mock_api_client):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        return httpx.Response(403, text="Forbidden")
+
+    client = mock_api_client(handler)
+    results = await asyncio.gather(
+        *(client.get_answer_rules("test.com", "101") for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    errors = [r for r in results if isinstance(r, HTTPException)]
+    assert len(errors) == len(results)
+    assert all(e.status_code == 403 for e in errors)
+    assert client.total_calls == 1
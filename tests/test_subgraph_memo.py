@@ -0,0 +1,235 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from graph_builder import GraphBuilder
+from models import (
+    EdgeData,
+    NodeData,
+    NSAnswerRule,
+    NSAutoAttendantResponse,
+    NSCallQueueAgent,
+    NSForwardingLogic,
+    NSPhoneNumber,
+    NSUser,
+)
+
+MAIN_AA = NSAutoAttendantResponse.model_validate(
+    {
+        "attendant-name": "Main Menu",
+        "user": "001",
+        "starting-prompt": "Prompt_1001",
+        "auto-attendant": {
+            "option-1": {
+                "destination-application": "callcenter",
+                "destination-user": "queue_sales",
+            },
+            "option-2": {
+                "destination-application": "to-user",
+                "destination-user": "102",
+            },
+        },
+    }
+)
+
+
+@pytest.fixture
+def make_client(mock_ns_client):
+    def make(did_count=50) -> MagicMock:
+        rules = {
+            "101": NSForwardingLogic(enabled="yes", parameters=["vmail_101"]),
+            "102": NSForwardingLogic(enabled="yes", parameters=["101"]),
+        }
+        return mock_ns_client(
+            get_users=[
+                NSUser(user="101", domain="test.com"),
+                NSUser(user="102", domain="test.com"),
+            ],
+            get_dids=[
+                NSPhoneNumber(
+                    phonenumber=f"555100{i:04d}",
+                    domain="test.com",
+                    dest="001:Prompt_1001",
+                )
+                for i in range(did_count)
+            ],
+            get_auto_attendant_prompts=MAIN_AA,
+            get_call_queue_agents=[NSCallQueueAgent(user="101")],
+            get_answer_rules=lambda domain, user: [
+                NSAnswerRule(
+                    domain="test.com",
+                    user=user,
+                    time_frame="*",
+                    forward_always=rules[user],
+                )
+            ],
+        )
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_shared_subgraph_is_materialized_once(monkeypatch, make_client):
+    builder = GraphBuilder(make_client(), "test.com")
+    expand_calls = []
+    original_expand = builder._expand_node
+
+    async def counting_expand(name, node_type):
+        expand_calls.append((name, node_type))
+        return await original_expand(name, node_type)
+
+    monkeypatch.setattr(builder, "_expand_node", counting_expand)
+    elements = await builder.build()
+
+    # AA, queue and user are each expanded once for all 50 DIDs. User 101
+    # is first reached as a queue agent, so no walk expands them.
+    assert sorted(expand_calls) == [
+        ("001:Prompt_1001", "auto_attendant"),
+        ("102", "user"),
+        ("sales", "call_queue"),
+    ]
+
+    # 50 roots + 50 destination edges + the shared subgraph
+    ids = [e.data.id or "" for e in elements]
+    assert len(ids) == len(set(ids))
+    assert ids.count("auto_attendant_001_Prompt_1001") == 1
+    assert len([i for i in ids if i.startswith("did_")]) == 50
+
+
+@pytest.mark.asyncio
+async def test_later_dids_link_into_existing_subgraph(make_client):
+    builder = GraphBuilder(make_client(did_count=2), "test.com")
+
+    first, second = await builder.client.get_dids("test.com")
+    first_path = await builder._process_did_path(first)
+    second_path = await builder._process_did_path(second)
+
+    assert len(first_path) > 2
+    # Only the new root and its edge into the already-walked AA
+    assert [e.id for e in second_path] == [
+        "did_5551000001",
+        "edge_did_5551000001_auto_attendant_001_Prompt_1001",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_agent_reached_first_is_not_walked_by_that_did(make_client):
+    # User 101 is reached as a (non-expanding) queue agent via Press 1 before
+    # user 102 (Press 2) forwards to them. As in a sequential crawl, the
+    # walk links 102 to them but doesn't walk their answer rules.
+    builder = GraphBuilder(make_client(did_count=1), "test.com")
+    elements = await builder.build()
+
+    edges = [e.data for e in elements if isinstance(e.data, EdgeData)]
+    assert any(e.source == "user_102" and e.target == "user_101" for e in edges)
+    assert not any(e.source == "user_101" for e in edges)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_concurrency", [1, 8])
+async def test_shared_node_parent_does_not_depend_on_timing(
+    max_concurrency, mock_ns_client
+):
+    # DID 1 reaches the menu through its owner, DID 2 directly. The slow
+    # answer-rule fetch lets DID 2's walk materialize the menu first.
+    async def get_answer_rules(domain, user):
+        await asyncio.sleep(0.01)
+        return [
+            NSAnswerRule(
+                domain="test.com",
+                user=user,
+                time_frame="*",
+                forward_always=NSForwardingLogic(
+                    enabled="yes", parameters=["100:Prompt_1"]
+                ),
+            )
+        ]
+
+    mock_client = mock_ns_client(
+        get_users=[NSUser(user="100", domain="test.com")],
+        get_dids=[
+            NSPhoneNumber(phonenumber="5550001", domain="test.com", dest="100"),
+            NSPhoneNumber(
+                phonenumber="5550002", domain="test.com", dest="100:Prompt_1"
+            ),
+        ],
+        get_auto_attendant_prompts=MAIN_AA,
+        get_answer_rules=get_answer_rules,
+    )
+    builder = GraphBuilder(mock_client, "test.com", max_concurrency=max_concurrency)
+    elements = await builder.build()
+
+    menu = next(e.data for e in elements if e.data.id == "auto_attendant_100_Prompt_1")
+    assert isinstance(menu, NodeData)
+    assert menu.parent == "user_100"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_concurrency", [1, 8])
+async def test_element_order_matches_the_sequential_crawl(
+    max_concurrency, world_client
+):
+    # DID 1 reaches user 100 as a queue agent, which doesn't walk them; DID 3
+    # walks them. Users 105 and 100 both forward into 100's menu.
+    world = {
+        "dids": [
+            NSPhoneNumber(phonenumber="5550001", domain="test.com", dest="queue_900"),
+            NSPhoneNumber(phonenumber="5550002", domain="test.com", dest="105"),
+            NSPhoneNumber(phonenumber="5550003", domain="test.com", dest="100"),
+        ],
+        "users": [NSUser(user=u, domain="test.com") for u in ("100", "105")],
+        "rules": {
+            user: [
+                NSAnswerRule(
+                    domain="test.com",
+                    user=user,
+                    time_frame="*",
+                    forward_always=NSForwardingLogic(
+                        enabled="yes", parameters=["100:Prompt_0"]
+                    ),
+                )
+            ]
+            for user in ("100", "105")
+        },
+        "aa": {
+            "100:Prompt_0": NSAutoAttendantResponse.model_validate(
+                {
+                    "attendant-name": "Main Menu",
+                    "user": "100",
+                    "starting-prompt": "Prompt_0",
+                    "auto-attendant": {
+                        "option-1": {
+                            "destination-application": "to-user",
+                            "destination-user": "vmail_100",
+                        }
+                    },
+                }
+            )
+        },
+        "queues": {"900": [NSCallQueueAgent(user="100")]},
+    }
+    builder = GraphBuilder(world_client(world), "test.com", max_concurrency)
+    elements = await builder.build()
+
+    # What the sequential crawl returned for this domain
+    assert [
+        (e.data.id, e.data.parent) if isinstance(e.data, NodeData) else e.data.id
+        for e in elements
+    ] == [
+        ("did_5550001", None),
+        "edge_did_5550001_call_queue_900",
+        ("call_queue_900", None),
+        "edge_call_queue_900_user_100",
+        ("user_100", None),
+        ("did_5550002", None),
+        "edge_did_5550002_user_105",
+        ("user_105", None),
+        "edge_user_105_auto_attendant_100_Prompt_0",
+        ("auto_attendant_100_Prompt_0", "user_105"),
+        "edge_auto_attendant_100_Prompt_0_voicemail_vmail_100",
+        ("voicemail_vmail_100", None),
+        ("did_5550003", None),
+        "edge_did_5550003_user_100",
+        "edge_user_100_auto_attendant_100_Prompt_0",
+    ]
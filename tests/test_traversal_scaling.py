@@ -0,0 +1,58 @@
+import gc
+import time
+
+import pytest
+
+from graph_builder import GraphBuilder
+from models import NSAnswerRule, NSForwardingLogic, NSPhoneNumber
+
+
+@pytest.fixture
+def make_builder(mock_ns_client):
+    def make(edge_count) -> GraphBuilder:
+        # One user simultaneously ringing edge_count devices: a single BFS
+        # level holding every edge, the worst case for a list-based queue.
+        mock_client = mock_ns_client(
+            get_answer_rules=[
+                NSAnswerRule(
+                    domain="test.com",
+                    user="100",
+                    time_frame="*",
+                    simultaneous_ring=NSForwardingLogic(
+                        enabled="yes",
+                        parameters=[f"phone_dev{i}" for i in range(edge_count)],
+                    ),
+                )
+            ]
+        )
+        return GraphBuilder(mock_client, "test.com")
+
+    return make
+
+
+async def time_walk(make_builder, edge_count, rounds=3):
+    did = NSPhoneNumber(phonenumber="5550001000", domain="test.com", dest="user_100")
+    best = float("inf")
+    for _ in range(rounds):
+        builder = make_builder(edge_count)
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            elements = await builder._process_did_path(did)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    # root + user + (edge, device) per target, plus the DID -> user edge
+    assert len(elements) == 3 + 2 * edge_count
+    return best
+
+
+@pytest.mark.asyncio
+async def test_traversal_scales_linearly_on_10k_edges(make_builder):
+    small = await time_walk(make_builder, 1_000)
+    large = await time_walk(make_builder, 10_000)
+
+    # 10x the edges should cost ~10x the time; a quadratic queue is ~100x.
+    ratio = large / small
+    print(f"1k edges: {small:.3f}s, 10k edges: {large:.3f}s, ratio {ratio:.1f}")
+    assert ratio < 25